@@ -1,11 +1,23 @@
 import streamlit as st
 from app import app
-from database import create_all_tables
+from migrations import ensure_schema
+from model_registry import get_registry
+from quotes import get_quote_cache
+from ticker_registry import get_ticker_registry
 
 def main():
     
-    # Create database tables
-    create_all_tables()
+    # Create or update the database tables, only the first run in each process touches the database
+    ensure_schema()
+    
+    # Start loading the prediction model in the background so the first prediction does not wait for it
+    get_registry()
+    
+    # Start refreshing the prices of held positions in the background
+    get_quote_cache()
+    
+    # Load the saved S&P 500 list and keep it refreshed for the company selectboxes
+    get_ticker_registry()
     
     # Run the Streamlit app
     app()
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+
+from forecasting import SEQUENCE_LENGTH
+from storage import atomic_write, cache_path
+from windowing import sliding_windows
+
+# Fraction of the sequences used for training when the backtest is first built, as in the research component
+TRAIN_FRACTION = 0.8
+
+
+class Backtest:
+    """
+    Test-set predictions for one ticker together with running error sums.
+    """
+
+    def __init__(self, dates, actual, predicted, scale, offset, sums=None):
+        self.dates = dates
+        self.actual = actual
+        self.predicted = predicted
+        # MinMaxScaler parameters from the first evaluation, kept fixed so old predictions never change
+        self.scale = scale
+        self.offset = offset
+        self.sums = sums or {'n': 0, 'squared': 0.0, 'absolute': 0.0, 'percentage': 0.0}
+        if sums is None:
+            self._add_to_sums(actual, predicted)
+
+    def _add_to_sums(self, actual, predicted, sign=1):
+        errors = predicted - actual
+        self.sums['n'] += sign * len(errors)
+        self.sums['squared'] += sign * float(np.sum(errors ** 2))
+        self.sums['absolute'] += sign * float(np.sum(np.abs(errors)))
+        self.sums['percentage'] += sign * float(np.sum(np.abs(errors / actual)))
+
+    def extend(self, dates, actual, predicted):
+        """
+        Append predictions for new bars and update the error sums with them only.
+        """
+        self.dates = np.concatenate([self.dates, dates])
+        self.actual = np.concatenate([self.actual, actual])
+        self.predicted = np.concatenate([self.predicted, predicted])
+        self._add_to_sums(actual, predicted)
+
+    def drop_last(self):
+        """
+        Remove the last bar and take its error out of the sums, so it can be predicted again.
+        """
+        self._add_to_sums(self.actual[-1:], self.predicted[-1:], sign=-1)
+        self.dates = self.dates[:-1]
+        self.actual = self.actual[:-1]
+        self.predicted = self.predicted[:-1]
+
+    @property
+    def metrics(self):
+        """
+        RMSE, MAE and MAPE (in percent) over every backtested bar.
+        """
+        n = self.sums['n']
+        if n == 0:
+            return {'rmse': None, 'mae': None, 'mape': None, 'n': 0}
+        return {
+            'rmse': float(np.sqrt(self.sums['squared'] / n)),
+            'mae': self.sums['absolute'] / n,
+            'mape': 100 * self.sums['percentage'] / n,
+            'n': n,
+        }
+
+
+class BacktestStore:
+    """
+    Backtest results per ticker, persisted on local disk.
+
+    The first evaluation of a ticker predicts its whole test split. Later evaluations only
+    predict the bars that arrived since, and keep RMSE, MAE and MAPE up to date incrementally.
+    Different tickers are evaluated concurrently, only the shared metrics file is written one at a time.
+    """
+
+    def __init__(self, folder='backtests'):
+        self.metrics_path = cache_path(folder, 'metrics.json')
+        self.folder = os.path.dirname(self.metrics_path)
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def _path(self, key):
+        return os.path.join(self.folder, hashlib.sha1('|'.join(key).encode()).hexdigest() + '.npz')
+
+    def _load(self, key):
+        try:
+            with np.load(self._path(key)) as record:
+                return Backtest(record['dates'], record['actual'], record['predicted'],
+                                float(record['scale']), float(record['offset']), json.loads(str(record['sums'])))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save(self, key, ticker, backtest):
+        atomic_write(self._path(key), lambda f: np.savez(
+            f, dates=backtest.dates, actual=backtest.actual, predicted=backtest.predicted,
+            scale=backtest.scale, offset=backtest.offset, sums=json.dumps(backtest.sums)))
+
+        with self.lock:
+            metrics = self.all_metrics()
+            metrics[ticker] = dict(backtest.metrics, last_bar=str(np.datetime64(backtest.dates[-1], 'D')) if len(backtest.dates) else None)
+            atomic_write(self.metrics_path, lambda f: json.dump(metrics, f, indent=1), mode='w')
+
+    def all_metrics(self):
+        """
+        Latest metrics of every backtested ticker, for comparing accuracy across tickers.
+
+        :return: Dictionary of ticker symbol to metrics.
+        """
+        try:
+            with open(self.metrics_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def update(self, ticker, df, model, model_hash):
+        """
+        Return the backtest for the ticker, predicting only bars that are not backtested yet.
+
+        :param ticker: Ticker symbol.
+        :param df: DataFrame with the Close prices, indexed by date.
+        :param model: Trained model.
+        :param model_hash: Hash of the model file, a new model starts a new backtest.
+        :return: Backtest.
+        """
+        key = (ticker, str(df.index.min().date()), model_hash)
+        close = df['Close'].values.reshape(-1, 1)
+        dates = df.index.values
+
+        # Only evaluations of the same backtest wait for each other, the model call runs outside the store lock
+        with self._key_lock(key):
+            backtest = self._load(key)
+            if backtest is None:
+                backtest = self._evaluate_test_split(close, dates, model)
+            else:
+                # Only bars after the last backtested one with a full window before them are new
+                start = int(np.searchsorted(dates, backtest.dates[-1], side='right')) if len(backtest.dates) else SEQUENCE_LENGTH
+                last = start - 1
+                if len(backtest.dates) and last >= 0 and dates[last] == backtest.dates[-1] and close[last, 0] != backtest.actual[-1, 0]:
+                    # The last bar was scored with an intraday close that has since been replaced by the final one
+                    backtest.drop_last()
+                    start = last
+                start = max(start, SEQUENCE_LENGTH)
+                if start >= len(close):
+                    return backtest
+                scaled = close * backtest.scale + backtest.offset
+                windows = sliding_windows(scaled[start - SEQUENCE_LENGTH:len(close) - 1], SEQUENCE_LENGTH)
+                predicted = (model.predict(windows) - backtest.offset) / backtest.scale
+                backtest.extend(dates[start:], close[start:], predicted)
+            self._save(key, ticker, backtest)
+            return backtest
+
+    @staticmethod
+    def _evaluate_test_split(close, dates, model):
+        """
+        Predict the whole test split the same way the Actual vs Predicted chart always has.
+        """
+        scaler = MinMaxScaler()
+        scaled = scaler.fit_transform(close)
+        X = sliding_windows(scaled, SEQUENCE_LENGTH)[:-1]
+
+        split_index = int(len(X) * TRAIN_FRACTION)
+        X_test = X[split_index:]
+        test_start_idx = split_index + SEQUENCE_LENGTH
+
+        # Inverse of the scaler, written out so that an empty test split needs no special case
+        scale, offset = float(scaler.scale_[0]), float(scaler.min_[0])
+        predicted = model.predict(X_test) if len(X_test) else np.empty((0, 1))
+        return Backtest(dates[test_start_idx:test_start_idx + len(X_test)], close[test_start_idx:test_start_idx + len(X_test)],
+                        (predicted - offset) / scale, scale, offset)
@@ -0,0 +1,181 @@
+"""
+Nightly batch forecast for every S&P 500 ticker.
+
+The forecasts are written to the same ForecastCache the Stock Prediction page reads, so the
+page serves them without running the model. Run from the forca_web_app folder:
+
+    python batch_forecast.py                                # prices from yfinance
+    python batch_forecast.py --prices-dir fixtures/prices   # offline, one <TICKER>.csv per ticker
+    python batch_forecast.py --write-fixture fixtures/prices  # download once and save a fixture
+"""
+import argparse
+import datetime
+import os
+import time
+
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+
+from forecast_cache import ForecastCache, file_hash, forecast_key
+from forecasting import SEQUENCE_LENGTH, load_forecast_model, rollout
+from market_data import FixtureProvider
+from model_registry import ModelRegistry
+from ticker_registry import TickerRegistry
+from upstream import YAHOO
+from windowing import last_window
+
+# Same default start date as the Stock Prediction page, so the cached keys match what the page asks for
+DEFAULT_START = '2022-01-01'
+
+
+def load_fixture_prices(prices_dir, tickers, start, end):
+    """
+    Load prices for the tickers from a folder of <TICKER>.csv or <TICKER>.parquet files.
+
+    :param prices_dir: Folder containing one file per ticker, indexed by date.
+    :param tickers: Ticker symbols to load.
+    :param start: First date to keep.
+    :param end: Date to stop before.
+    :return: Dictionary of ticker symbol to price DataFrame, tickers without a file are skipped.
+    """
+    # Same reader the app uses with FORCA_MARKET_DATA=fixture:<folder>
+    provider = FixtureProvider(prices_dir)
+    prices = {}
+    for ticker in tickers:
+        df = provider.history(ticker, start, end)
+        if not df.empty:
+            prices[ticker] = df
+    return prices
+
+
+def download_prices(tickers, start, end, chunk_size=100):
+    """
+    Download prices for the tickers from yfinance, many tickers per request.
+
+    :param tickers: Ticker symbols to download.
+    :param start: First date to download.
+    :param end: Date to stop before.
+    :param chunk_size: Number of tickers per yfinance request.
+    :return: Dictionary of ticker symbol to price DataFrame.
+    """
+    import yfinance as yf
+
+    prices = {}
+    for i in range(0, len(tickers), chunk_size):
+        chunk = tickers[i:i + chunk_size]
+        try:
+            # Tickers yfinance could not download come back empty and are skipped below
+            data = YAHOO.call(('bulk history', tuple(chunk), start, end),
+                              lambda: yf.download(chunk, start=start, end=end, group_by='ticker', progress=False))
+        except Exception as e:
+            # The other chunks are still forecast, while the breaker is open they fail without a request
+            print(f"Could not download {chunk[0]}..{chunk[-1]}: {e}")
+            continue
+        for ticker in chunk:
+            if ticker in data.columns.get_level_values(0):
+                df = data[ticker].dropna(how='all')
+                if not df.empty:
+                    prices[ticker] = df
+    return prices
+
+
+def write_fixture(prices, prices_dir):
+    """
+    Save downloaded prices as a folder of <TICKER>.csv files for offline runs.
+    """
+    os.makedirs(prices_dir, exist_ok=True)
+    for ticker, df in prices.items():
+        df.to_csv(os.path.join(prices_dir, f"{ticker}.csv"))
+
+
+def build_last_windows(prices):
+    """
+    Scale every ticker's Close prices on its own and stack the last windows into one batch.
+
+    The windows are built exactly like prepare_last_sequence on the Stock Prediction page.
+
+    :param prices: Dictionary of ticker symbol to price DataFrame.
+    :return: Tuple of the usable tickers, their windows of shape (tickers, SEQUENCE_LENGTH) and their scalers.
+    """
+    tickers, windows, scalers = [], [], []
+    for ticker, df in prices.items():
+        if len(df) < SEQUENCE_LENGTH + 1:
+            print(f"Skipping {ticker}: only {len(df)} bars")
+            continue
+        scaler = MinMaxScaler()
+        scaled_close = scaler.fit_transform(df['Close'].values.reshape(-1, 1))
+        tickers.append(ticker)
+        windows.append(last_window(scaled_close[:, 0], SEQUENCE_LENGTH, offset=1))
+        scalers.append(scaler)
+    return tickers, np.array(windows, dtype=np.float32).reshape(-1, SEQUENCE_LENGTH), scalers
+
+
+def forecast_batches(model, windows, horizon, batch_size):
+    """
+    Roll out the forecast for all windows, batch_size windows per model call.
+
+    :return: Scaled predictions of shape (tickers, horizon).
+    """
+    predictions = np.empty((len(windows), horizon), dtype=np.float32)
+    for i in range(0, len(windows), batch_size):
+        predictions[i:i + batch_size] = rollout(model, windows[i:i + batch_size], horizon)
+    return predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast every S&P 500 ticker and store the results for the Stock Prediction page.')
+    parser.add_argument('--tickers', help='Comma separated tickers, defaults to the S&P 500 list of the ticker registry.')
+    parser.add_argument('--prices-dir', help='Read prices from this folder of <TICKER>.csv or .parquet files instead of yfinance.')
+    parser.add_argument('--write-fixture', metavar='DIR', help='Save the downloaded prices to DIR for later offline runs.')
+    parser.add_argument('--start', default=DEFAULT_START, help='First price date (default: %(default)s).')
+    parser.add_argument('--end', default=datetime.datetime.now().strftime("%Y-%m-%d"), help='Date to stop before (default: today).')
+    parser.add_argument('--horizon', type=int, default=100, help='Number of days to forecast (default: %(default)s).')
+    parser.add_argument('--batch-size', type=int, default=512, help='Tickers per model call (default: %(default)s).')
+    parser.add_argument('--model', help='Path to the .keras model, defaults to the active version in the model registry.')
+    args = parser.parse_args()
+
+    if args.tickers:
+        tickers = [ticker.strip() for ticker in args.tickers.split(',') if ticker.strip()]
+    else:
+        # The saved S&P 500 snapshot, scraped only when there is none yet
+        tickers = TickerRegistry().universe.symbols
+
+    started = time.perf_counter()
+    if args.prices_dir:
+        prices = load_fixture_prices(args.prices_dir, tickers, args.start, args.end)
+    else:
+        prices = download_prices(tickers, args.start, args.end)
+        if args.write_fixture:
+            write_fixture(prices, args.write_fixture)
+    loaded = time.perf_counter()
+
+    if not args.model:
+        registry = ModelRegistry()
+        args.model = registry.path_for(registry.active_version())
+    # Hashed before loading, so the forecasts are never stored under a file that replaced the loaded one
+    model_hash = file_hash(args.model)
+    model = load_forecast_model(args.model)
+    batch_tickers, windows, scalers = build_last_windows(prices)
+    if not batch_tickers:
+        print("No tickers with enough price history to forecast.")
+        return
+
+    forecast_started = time.perf_counter()
+    predictions = forecast_batches(model, windows, args.horizon, args.batch_size)
+    forecast_time = time.perf_counter() - forecast_started
+
+    # Store the forecasts in price scale, in the same shape predict_future_prices returns
+    cache = ForecastCache()
+    for ticker, scaler, predicted in zip(batch_tickers, scalers, predictions):
+        key = forecast_key(ticker, prices[ticker], model_hash)
+        cache.put(key, scaler.inverse_transform(predicted.reshape(-1, 1)))
+    total_time = time.perf_counter() - started
+
+    print(f"Loaded prices for {len(prices)}/{len(tickers)} tickers in {loaded - started:.2f}s")
+    print(f"Forecast {len(batch_tickers)} tickers x {args.horizon} days in {forecast_time:.2f}s "
+          f"({len(batch_tickers) / forecast_time:.1f} tickers/s)")
+    print(f"Total {total_time:.2f}s ({len(batch_tickers) / total_time:.1f} tickers/s end to end)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark the rollout engine against the original one-predict-call-per-day loop.
+
+Run from the forca_web_app folder:
+    python -m benchmarks.rollout --model ../my_lstm_model.keras --steps 100
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forecasting import SEQUENCE_LENGTH, rollout
+from numpy_lstm import NumpyLSTM
+
+
+def legacy_rollout(model, last_sequence, n_future_steps):
+    """
+    The original predict_future_prices loop, kept here as the reference implementation.
+    """
+    future_predictions = []
+    current_sequence = last_sequence
+    for _ in range(n_future_steps):
+        predicted = model.predict(current_sequence.reshape(1, SEQUENCE_LENGTH, 1), verbose=0)
+        future_predictions.append(predicted[0][0])
+        current_sequence = np.roll(current_sequence, -1)
+        current_sequence[-1] = predicted
+    return np.array(future_predictions)
+
+
+def synthetic_sequence(seed=0):
+    """
+    Scaled random-walk price sequence so the benchmark runs without network access.
+    """
+    prices = 100 + np.cumsum(np.random.default_rng(seed).normal(0, 1, SEQUENCE_LENGTH))
+    return ((prices - prices.min()) / (prices.max() - prices.min())).reshape(-1, 1)
+
+
+def timed(function, repeats):
+    """
+    Return the result of the last call and the best wall time over the given number of repeats.
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default='../my_lstm_model.keras', help='Path to the .keras model file.')
+    parser.add_argument('--steps', type=int, default=100, help='Number of future days to predict.')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed repetitions per implementation.')
+    args = parser.parse_args()
+
+    from tensorflow.keras.models import load_model
+
+    model = load_model(args.model)
+    last_sequence = synthetic_sequence()
+
+    # Warm up both paths so graph tracing is not part of the measurement
+    legacy_rollout(model, last_sequence.copy(), 1)
+    rollout(model, last_sequence, args.steps)
+
+    expected, legacy_time = timed(lambda: legacy_rollout(model, last_sequence.copy(), args.steps), args.repeats)
+    actual, engine_time = timed(lambda: rollout(model, last_sequence, args.steps), args.repeats)
+
+    print(f"steps:            {args.steps}")
+    print(f"legacy loop:      {legacy_time * 1000:.1f} ms")
+    print(f"rollout engine:   {engine_time * 1000:.1f} ms")
+    print(f"speedup:          {legacy_time / engine_time:.1f}x")
+    print(f"max abs diff:     {np.max(np.abs(expected - actual)):.2e}")
+
+    numpy_model = NumpyLSTM.from_keras_archive(args.model)
+    numpy_actual, numpy_time = timed(lambda: rollout(numpy_model, last_sequence, args.steps), args.repeats)
+    print(f"numpy backend:    {numpy_time * 1000:.1f} ms")
+    print(f"speedup:          {legacy_time / numpy_time:.1f}x")
+    print(f"max abs diff:     {np.max(np.abs(expected - numpy_actual)):.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,85 +1,140 @@
 import psycopg2
+import psycopg2.pool
 from dotenv import load_dotenv
 import os
+import threading
+import time
+from contextlib import contextmanager
 
 # Load environment variables from .env file
 load_dotenv()
 
 
 
-def connect_to_database():
+# Size of the process-wide connection pool, every Streamlit session shares it
+POOL_MIN_CONNECTIONS = int(os.environ.get('DB_POOL_MIN', 1))
+POOL_MAX_CONNECTIONS = int(os.environ.get('DB_POOL_MAX', 10))
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+# Connections idle for longer than this many seconds are pinged before they are handed out
+HEALTH_CHECK_IDLE = float(os.environ.get('DB_POOL_HEALTH_CHECK_IDLE', 30))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+# id() of a pooled connection to the time it was last returned
+_last_used = {}
+
+
+def get_pool():
     """
-    Connection to PostgreSQL is established
+    Return the process-wide PostgreSQL connection pool, connecting the first time it is called.
     """
-    # Get database connection parameters from environment variables
-    db_name = os.environ.get('DB_NAME')
-    db_user = os.environ.get('DB_USER')
-    db_password = os.environ.get('DB_PASSWORD')
-    db_host = os.environ.get('DB_HOST')
-    db_port = os.environ.get('DB_PORT')
-    
-    try:
-        # Connect to PostgreSQL database
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_user,
-            password=db_password,
-            host=db_host,
-            port=db_port,
-            sslmode='require'
-        )
-        print("Connected to the database")
-        return conn
-    except psycopg2.Error as e:
-        print("Error connecting to the database:", e)
-        return None
-    
-
-def create_table(table_name, table_schema):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Get database connection parameters from environment variables
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                POOL_MIN_CONNECTIONS,
+                POOL_MAX_CONNECTIONS,
+                dbname=os.environ.get('DB_NAME'),
+                user=os.environ.get('DB_USER'),
+                password=os.environ.get('DB_PASSWORD'),
+                host=os.environ.get('DB_HOST'),
+                port=os.environ.get('DB_PORT'),
+                sslmode='require'
+            )
+            print("Connected to the database")
+    return _pool
+
+
+def _is_healthy(conn):
     """
-    Create Table statements to initialize the database table scheme
+    Check a pooled connection before handing it out. Recently used connections are trusted, idle
+    ones are pinged because the server or a proxy may have dropped them.
     """
-    conn = connect_to_database()
-    cur = conn.cursor()
-
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < HEALTH_CHECK_IDLE:
+        return True
     try:
-        # SQL command to create the table
-        sql = f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            {table_schema}
-        );
-        """
-
-        # Execute the SQL command
-        cur.execute(sql)
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
 
-        # Commit the transaction
-        conn.commit()
 
-        print(f"Table {table_name} created successfully!")
+def get_connection():
+    """
+    Check out a healthy connection from the pool, waiting up to POOL_TIMEOUT seconds for a free one.
 
-    except Exception as e:
-        print(f"Error creating table {table_name}: {e}")
+    Return it with release_connection, or use db_transaction which does both.
+    """
+    pool = get_pool()
+    if not _pool_slots.acquire(timeout=POOL_TIMEOUT):
+        raise psycopg2.pool.PoolError("No database connection became free in time.")
+    try:
+        # Every broken connection is replaced by a new one, give up after as many tries as the pool is large
+        for _ in range(POOL_MAX_CONNECTIONS + 1):
+            conn = pool.getconn()
+            if _is_healthy(conn):
+                return conn
+            print("Replacing a broken database connection")
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("Could not get a working database connection.")
+    except BaseException:
+        _pool_slots.release()
+        raise
 
-    finally:
-        # Close the cursor and connection
-        cur.close()
-        conn.close()
 
-def create_all_tables():
+def release_connection(conn, close=False):
     """
-    All of the tables used for the application are listed here and iterated over to create them in the database
+    Return a connection checked out with get_connection to the pool.
+
+    :param conn: The connection.
+    :param close: Close it instead of keeping it for reuse, for connections that failed.
     """
-    # Define table names and schemas
-    tables = [
-        ("users", "id SERIAL PRIMARY KEY, email VARCHAR(100) NOT NULL"),
-        ("demo_accounts", "demo_id SERIAL PRIMARY KEY, allocated_amount DECIMAL(10, 2) NOT NULL, user_id INT NOT NULL, FOREIGN KEY (user_id) REFERENCES users(id)"),
-        ("transactions", "transaction_id SERIAL PRIMARY KEY, transaction_type VARCHAR(5) NOT NULL CHECK (transaction_type IN ('BUY', 'SELL')), stock_symbol VARCHAR(10) NOT NULL, quantity INT NOT NULL, price DECIMAL(10, 2) NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, demo_id INT NOT NULL, status VARCHAR(10) NOT NULL DEFAULT 'OPEN' CHECK (status IN ('OPEN', 'CLOSED')), FOREIGN KEY (demo_id) REFERENCES demo_accounts(demo_id)"),
-        # Add more tables here 
-    ]
+    try:
+        if close or conn.closed:
+            _last_used.pop(id(conn), None)
+            get_pool().putconn(conn, close=True)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+            get_pool().putconn(conn)
+    finally:
+        _pool_slots.release()
 
-    # Create tables
-    for table_name, table_schema in tables:
-        create_table(table_name, table_schema)
 
+@contextmanager
+def db_transaction():
+    """
+    Check out a pooled connection for one transaction.
 
+    The transaction is committed when the block finishes and rolled back when it raises,
+    and the connection goes back to the pool either way. A connection that failed with an
+    OperationalError or InterfaceError, or could not be rolled back, is closed instead.
+
+        with db_transaction() as conn:
+            with conn.cursor() as cur:
+                cur.execute(...)
+    """
+    conn = get_connection()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except BaseException as e:
+        broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error as rollback_error:
+                # The original error is the one raised, the connection is not used again
+                print(f"Rollback failed: {rollback_error}")
+                broken = True
+        raise
+    finally:
+        release_connection(conn, close=broken)
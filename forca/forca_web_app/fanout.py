@@ -0,0 +1,87 @@
+"""
+Run independent page fetches at the same time, each with its own timeout.
+
+A page hands fan_out a dictionary of named fetch functions and renders every result as soon as it
+arrives, so its latency follows the slowest source instead of the sum of all of them.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Shared by every session, the fetches only wait on the network
+MAX_WORKERS = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the process-wide thread pool used for page fetches.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='page-fetch')
+    return _executor
+
+
+def _in_script_context(function):
+    """
+    Let a fetch running in a pool thread use st.cache_data like the page that started it.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    except ImportError:
+        return function
+    # Scripts and batch jobs run without a Streamlit session
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return function
+
+    def run():
+        thread = threading.current_thread()
+        add_script_run_ctx(thread, ctx)
+        try:
+            return function()
+        finally:
+            # Pool threads are reused, the next fetch may belong to another session
+            add_script_run_ctx(thread, None)
+    return run
+
+
+def fan_out(sources, executor=None):
+    """
+    Start every source at once and yield the results in the order they finish.
+
+    A source that is still running when its timeout is over is reported with a TimeoutError and
+    left to finish in the background, its result is dropped.
+
+    :param sources: Dictionary of name to (function without arguments, timeout in seconds).
+    :param executor: Thread pool to run the functions on, defaults to the shared pool.
+    :return: Generator of (name, result, error) tuples, error is None when the fetch succeeded.
+    """
+    executor = executor or get_executor()
+    started = time.monotonic()
+    names, timeouts = {}, {}
+    for name, (function, timeout) in sources.items():
+        future = executor.submit(_in_script_context(function))
+        names[future] = name
+        timeouts[future] = timeout
+
+    pending = set(names)
+    while pending:
+        next_deadline = started + min(timeouts[future] for future in pending)
+        done, _ = wait(pending, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            try:
+                yield names[future], future.result(), None
+            except Exception as e:
+                yield names[future], None, e
+
+        elapsed = time.monotonic() - started
+        for future in [future for future in pending if timeouts[future] <= elapsed]:
+            pending.discard(future)
+            future.cancel()
+            yield names[future], None, TimeoutError(f"{names[future]} did not answer within {timeouts[future]:g}s")
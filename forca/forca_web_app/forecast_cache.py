@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from storage import atomic_write, cache_path
+
+# Maximum number of cached forecasts before the least recently used ones are evicted
+MAX_ENTRIES = int(os.environ.get('FORCA_FORECAST_CACHE_SIZE', 2000))
+
+_file_hashes = {}
+
+
+def file_hash(path):
+    """
+    Return the SHA-256 of a file, remembered for as long as its size and modification time do not change.
+
+    :param path: Path to the file, usually the model.
+    :return: Hex digest.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _file_hashes.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    _file_hashes[path] = (signature, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def forecast_key(ticker, df, model_hash, kind='forecast'):
+    """
+    Build the cache key for a ticker's price data and model.
+
+    The first bar is part of the key because the scaler is fit on the whole loaded range, and a hash
+    of the closes because providers revise past closes and today's bar changes during the day.
+    The closes are hashed as float32, so the float32 history cache and the float64 batch job share keys.
+
+    :param ticker: Ticker symbol.
+    :param df: DataFrame of prices indexed by date.
+    :param model_hash: file_hash of the model file the forecasts are computed with, taken when it was loaded.
+    :param kind: What is cached under the key, future price forecasts by default.
+    :return: Tuple key.
+    """
+    first_bar = str(df.index.min().date())
+    last_bar = str(df.index.max().date())
+    closes = hashlib.sha1(np.ascontiguousarray(df['Close'].to_numpy(dtype=np.float32))).hexdigest()
+    return (kind, ticker, first_bar, last_bar, closes, model_hash)
+
+
+class ForecastCache:
+    """
+    LRU cache of forecast arrays persisted on local disk.
+
+    Every entry keeps the longest horizon computed for its key, so a request for a shorter
+    horizon is served from the front of a longer cached forecast.
+    """
+
+    def __init__(self, folder='forecasts', max_entries=MAX_ENTRIES):
+        self.index_path = cache_path(folder, 'index.json')
+        self.folder = os.path.dirname(self.index_path)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        try:
+            with open(self.index_path) as f:
+                self.entries = OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha1('|'.join(map(str, key)).encode()).hexdigest()
+
+    def _save_index(self):
+        atomic_write(self.index_path, lambda f: json.dump(list(self.entries.items()), f), mode='w')
+
+    def get(self, key, horizon=None):
+        """
+        Return the cached values for key, or None on a miss.
+
+        :param key: Key from forecast_key.
+        :param horizon: Number of values needed, None for everything that is cached.
+        :return: Array with the first horizon values, or None.
+        """
+        name = self._name(key)
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or (horizon is not None and entry['horizon'] < horizon):
+                return None
+            self.entries.move_to_end(name)
+        try:
+            values = np.load(os.path.join(self.folder, name + '.npy'))
+        except (OSError, ValueError):
+            with self.lock:
+                self.entries.pop(name, None)
+            return None
+        return values if horizon is None else values[:horizon]
+
+    def put(self, key, values):
+        """
+        Store values for key unless a longer horizon is already cached.
+
+        :param key: Key from forecast_key.
+        :param values: Array whose first axis is the horizon.
+        """
+        values = np.asarray(values)
+        name = self._name(key)
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry['horizon'] >= len(values):
+                self.entries.move_to_end(name)
+                return
+            atomic_write(os.path.join(self.folder, name + '.npy'), lambda f: np.save(f, values))
+            self.entries[name] = {'horizon': len(values)}
+            self.entries.move_to_end(name)
+
+            # Evict the least recently used forecasts
+            while len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                try:
+                    os.remove(os.path.join(self.folder, evicted + '.npy'))
+                except OSError:
+                    pass
+            self._save_index()
+
+    def get_or_compute(self, key, horizon, compute):
+        """
+        Return cached values for key, computing and storing them on a miss.
+
+        :param key: Key from forecast_key.
+        :param horizon: Number of values needed.
+        :param compute: Function called with horizon that returns the values.
+        :return: Array with horizon values.
+        """
+        values = self.get(key, horizon)
+        if values is None:
+            values = compute(horizon)
+            self.put(key, values)
+        return values
@@ -0,0 +1,166 @@
+import os
+import weakref
+
+import numpy as np
+
+from numpy_lstm import load_numpy_lstm
+
+SEQUENCE_LENGTH = 200
+
+# 'numpy' runs the model without TensorFlow, set FORCA_MODEL_BACKEND=keras to use TensorFlow instead
+MODEL_BACKEND = os.environ.get('FORCA_MODEL_BACKEND', 'numpy')
+
+# Compiled rollout graphs, one per loaded Keras model
+_graph_rollouts = weakref.WeakKeyDictionary()
+
+
+def _is_keras_model(model):
+    """
+    Check whether the model is a Keras model without importing TensorFlow.
+    """
+    return any(cls.__module__.startswith(('keras', 'tensorflow')) for cls in type(model).__mro__)
+
+
+def _build_graph_rollout(model):
+    """
+    Build a tf.function that runs the whole autoregressive horizon inside a single graph call.
+
+    :param model: Trained Keras model.
+    :return: Compiled function taking (window, n_steps, noise) and returning predictions of shape (batch, n_steps).
+    """
+    import tensorflow as tf
+
+    @tf.function(reduce_retracing=True)
+    def run(window, n_steps, noise):
+        predictions = tf.TensorArray(tf.float32, size=n_steps)
+        for i in tf.range(n_steps):
+            # Predict the next price for every sequence in the batch
+            predicted = model(window, training=False) + noise[:, i:i + 1]
+            predictions = predictions.write(i, predicted[:, 0])
+            # Drop the oldest price and append the prediction at the end of the window
+            window = tf.concat([window[:, 1:, :], tf.expand_dims(predicted, 1)], axis=1)
+        return tf.transpose(predictions.stack())
+
+    return run
+
+
+def _graph_rollout(model, sequences, n_future_steps, noise):
+    """
+    Run the rollout for a Keras model as one compiled graph call.
+    """
+    import tensorflow as tf
+
+    try:
+        run = _graph_rollouts.get(model)
+        if run is None:
+            run = _graph_rollouts[model] = _build_graph_rollout(model)
+    except TypeError:
+        # Models that cannot be weakly referenced are compiled on every call
+        run = _build_graph_rollout(model)
+    predictions = run(tf.constant(sequences[..., None]), tf.constant(n_future_steps, dtype=tf.int32), tf.constant(noise))
+    return predictions.numpy()
+
+
+def _buffer_rollout(predict, sequences, n_future_steps, noise):
+    """
+    Run the rollout as a tight loop over a preallocated buffer.
+
+    The buffer holds the last sequence followed by room for every future prediction, so each step's
+    input window is a view into the buffer instead of a freshly rolled copy.
+    """
+    batch_size, sequence_length = sequences.shape
+    buffer = np.empty((batch_size, sequence_length + n_future_steps, 1), dtype=np.float32)
+    buffer[:, :sequence_length, 0] = sequences
+
+    for i in range(n_future_steps):
+        predicted = predict(buffer[:, i:i + sequence_length])
+        buffer[:, sequence_length + i, 0] = np.asarray(predicted, dtype=np.float32).reshape(batch_size) + noise[:, i]
+
+    return buffer[:, sequence_length:, 0].copy()
+
+
+def rollout(model, last_sequence, n_future_steps, noise=None):
+    """
+    Autoregressively predict n_future_steps values, feeding every prediction back in as the newest input.
+
+    Keras models run the whole horizon as one compiled graph call. Any other model only needs a
+    predict(batch) method returning an array of shape (batch, 1) and is driven over a preallocated buffer.
+
+    :param model: Trained model.
+    :param last_sequence: Scaled sequence of shape (sequence_length,) or (sequence_length, 1),
+                          or a batch of sequences of shape (batch, sequence_length[, 1]).
+    :param n_future_steps: Number of future steps to predict.
+    :param noise: Optional array of shape (batch, n_future_steps) added to every prediction before it is
+                  fed back, used to simulate sample paths.
+    :return: Scaled predictions of shape (n_future_steps,), or (batch, n_future_steps) for a batch.
+    """
+    sequences = np.asarray(last_sequence, dtype=np.float32)
+    single = sequences.ndim == 1 or (sequences.ndim == 2 and sequences.shape[-1] == 1)
+    if sequences.shape[-1] == 1:
+        sequences = sequences[..., 0]
+    sequences = np.atleast_2d(sequences)
+    if noise is None:
+        noise = np.zeros((len(sequences), max(n_future_steps, 0)), dtype=np.float32)
+    else:
+        noise = np.asarray(noise, dtype=np.float32).reshape(len(sequences), n_future_steps)
+
+    if n_future_steps < 1:
+        predictions = np.empty((len(sequences), 0), dtype=np.float32)
+    elif _is_keras_model(model):
+        predictions = _graph_rollout(model, sequences, n_future_steps, noise)
+    else:
+        predictions = _buffer_rollout(model.predict, sequences, n_future_steps, noise)
+
+    return predictions[0] if single else predictions
+
+
+def simulate_paths(model, last_sequence, residuals, n_future_steps, n_samples=100, seed=0):
+    """
+    Simulate forecast paths by bootstrapping one-step residuals into the rollout.
+
+    All paths are rolled out together as one batch of shape (n_samples, sequence_length). Noise is
+    drawn step by step, so the first k steps of a path do not depend on n_future_steps.
+
+    :param model: Trained model.
+    :param last_sequence: Scaled sequence of shape (sequence_length,) or (sequence_length, 1).
+    :param residuals: Scaled one-step errors (actual - predicted) to resample from.
+    :param n_future_steps: Number of future steps to predict.
+    :param n_samples: Number of simulated paths.
+    :param seed: Seed for the residual draws.
+    :return: Scaled paths of shape (n_samples, n_future_steps).
+    """
+    residuals = np.asarray(residuals, dtype=np.float32).ravel()
+    noise = np.random.default_rng(seed).choice(residuals, size=(n_future_steps, n_samples)).T
+    sequences = np.broadcast_to(np.asarray(last_sequence, dtype=np.float32).reshape(1, -1), (n_samples, np.size(last_sequence)))
+    return rollout(model, sequences, n_future_steps, noise=noise)
+
+
+def prediction_intervals(paths, lower=5, upper=95):
+    """
+    Percentile band over simulated paths.
+
+    :param paths: Paths of shape (n_samples, n_future_steps).
+    :param lower: Lower percentile.
+    :param upper: Upper percentile.
+    :return: Array of shape (n_future_steps, 2) with the lower and upper bound of every step.
+    """
+    return np.percentile(paths, [lower, upper], axis=0).T
+
+
+def load_forecast_model(path, backend=MODEL_BACKEND):
+    """
+    Load the trained LSTM model from a .keras file.
+
+    :param path: Path to the .keras file.
+    :param backend: 'numpy' for the TensorFlow-free backend, 'keras' for the Keras model.
+    :return: Model with a Keras compatible predict method.
+    """
+    if backend == 'numpy':
+        try:
+            return load_numpy_lstm(path)
+        except Exception as e:
+            print(f"NumPy model backend unavailable, falling back to TensorFlow: {e}")
+
+    # TensorFlow is only imported when it is actually needed
+    from tensorflow.keras.models import load_model
+    return load_model(path)
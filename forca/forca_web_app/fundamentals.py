@@ -0,0 +1,129 @@
+"""
+Company fundamentals (the yfinance Ticker.info dictionary), fetched once per ticker per day.
+
+Every page reads the fields it shows from the in-memory copy. The copies are also saved on disk,
+so a restart on the same day does not fetch them again. Fetch the whole S&P 500 ahead of the
+first visitors from the forca_web_app folder with:
+
+    python fundamentals.py
+    python fundamentals.py --tickers AAPL,MSFT --workers 4
+"""
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from market_data import get_provider
+from storage import atomic_write, cache_path
+from ticker_registry import TickerRegistry
+
+
+class FundamentalsCache:
+    """
+    Ticker.info dictionaries in memory and on disk, expiring when the day changes.
+
+    :param folder: Folder inside the cache folder for the JSON files.
+    :param fetch: Function (ticker) returning the info dictionary, defaults to the market data provider.
+    """
+
+    def __init__(self, folder='fundamentals', fetch=None):
+        self.folder = os.path.dirname(cache_path(folder, 'index'))
+        self.fetch = fetch or (lambda ticker: get_provider().info(ticker))
+        self.lock = threading.Lock()
+        self.ticker_locks = {}
+        # Ticker to (date fetched, info dictionary)
+        self.entries = {}
+
+    def _ticker_lock(self, ticker):
+        with self.lock:
+            return self.ticker_locks.setdefault(ticker, threading.Lock())
+
+    def _path(self, ticker):
+        return os.path.join(self.folder, f"{ticker.replace('/', '_')}.json")
+
+    def _read_disk(self, ticker):
+        try:
+            with open(self._path(ticker)) as f:
+                entry = json.load(f)
+            return datetime.date.fromisoformat(entry['date']), entry['info']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def get(self, ticker):
+        """
+        Return the info dictionary of a ticker, fetching it at most once a day.
+
+        Concurrent requests for the same ticker share a single fetch.
+
+        :param ticker: Ticker symbol.
+        :return: Dictionary of field name to value, empty when the provider knows nothing about the ticker.
+        """
+        today = datetime.date.today()
+        entry = self.entries.get(ticker)
+        if entry and entry[0] == today:
+            return entry[1]
+
+        with self._ticker_lock(ticker):
+            entry = self.entries.get(ticker)
+            if not entry or entry[0] != today:
+                entry = self._read_disk(ticker)
+            if not entry or entry[0] != today:
+                try:
+                    info = self.fetch(ticker) or {}
+                except Exception as e:
+                    print(f"Failed to fetch fundamentals for {ticker}: {e}")
+                    # Yesterday's figures are better than none, they are retried on the next call
+                    return entry[1] if entry else {}
+                entry = (today, info)
+                atomic_write(self._path(ticker), lambda f: json.dump({'date': str(today), 'info': info}, f, default=str), mode='w')
+            self.entries[ticker] = entry
+        return entry[1]
+
+    def prefetch(self, tickers, workers=8):
+        """
+        Make sure today's info of every ticker is on disk and in memory.
+
+        :param tickers: Ticker symbols.
+        :param workers: Number of tickers fetched at the same time.
+        :return: Number of tickers with a non-empty info dictionary.
+        """
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return sum(1 for info in pool.map(self.get, tickers) if info)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_fundamentals():
+    """
+    Return the process-wide fundamentals cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FundamentalsCache()
+    return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch today's fundamentals for every S&P 500 ticker into the local cache.")
+    parser.add_argument('--tickers', help='Comma separated tickers, defaults to the S&P 500 list of the ticker registry.')
+    parser.add_argument('--workers', type=int, default=8, help='Tickers fetched at the same time (default: %(default)s).')
+    args = parser.parse_args()
+
+    if args.tickers:
+        tickers = [ticker.strip() for ticker in args.tickers.split(',') if ticker.strip()]
+    else:
+        tickers = TickerRegistry().universe.symbols
+
+    started = time.perf_counter()
+    found = get_fundamentals().prefetch(tickers, args.workers)
+    print(f"Fundamentals for {found}/{len(tickers)} tickers in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Put on the queue by close, the worker stops when it takes it
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    In-process inference worker that merges concurrent predict calls into batched model calls.
+
+    Every Streamlit session thread calls predict, which puts the request on a queue and waits.
+    A single worker thread takes the first waiting request together with every request queued
+    behind it. A request arriving alone is run at once, otherwise the worker keeps collecting for
+    up to max_wait_ms (or until max_batch_size rows are queued). The batch is run as one model
+    call and every caller gets its own rows back.
+    """
+
+    def __init__(self, model, max_batch_size=256, max_wait_ms=5):
+        self.model = model
+        # Keras models have a light-weight single batch call, NumPy models only have predict
+        self._predict = getattr(model, 'predict_on_batch', model.predict)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'rows': 0, 'batches': 0, 'max_batch_rows': 0, 'max_queue_depth': 0, 'wait_seconds': 0.0}
+        self.closed = False
+        self.worker = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self.worker.start()
+
+    def predict(self, x, batch_size=None, verbose=0):
+        """
+        Predict for a batch of sequences, sharing the model call with other waiting callers.
+
+        :param x: Array of shape (batch, timesteps, features).
+        :param batch_size: Ignored, accepted for compatibility with the Keras predict signature.
+        :param verbose: Ignored, accepted for compatibility with the Keras predict signature.
+        :return: Predictions of shape (batch, 1).
+        """
+        x = np.asarray(x, dtype=np.float32)
+        future = Future()
+        with self.lock:
+            # Checked under the lock, so no request is queued behind the stop marker
+            closed = self.closed
+            if not closed:
+                self.requests.put((x, future, time.perf_counter()))
+                self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.requests.qsize())
+        if closed:
+            return np.asarray(self._predict(x))
+        return future.result()
+
+    def close(self):
+        """
+        Stop the worker thread after it has answered every request queued so far.
+
+        Later predict calls run the model directly in the calling thread.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.requests.put(_STOP)
+        self.worker.join()
+
+    def _collect(self):
+        """
+        Block for the first request, then gather more until the batch is full or the wait is over.
+
+        Only a batch that is being filled waits, a lone request is dispatched immediately so
+        sequential callers such as autoregressive rollouts do not pay max_wait_ms on every call.
+
+        :return: Tuple of the requests and whether the worker was asked to stop.
+        """
+        request = self.requests.get()
+        if request is _STOP:
+            return [], True
+        batch = [request]
+        rows = len(request[0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_size:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if len(batch) == 1 or remaining <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if request is _STOP:
+                return batch, True
+            batch.append(request)
+            rows += len(request[0])
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._serve(batch)
+
+    def _serve(self, batch):
+        """
+        Run the requests of a batch as few model calls as possible and answer every caller.
+        """
+        started = time.perf_counter()
+
+        # Requests can only share a model call when their sequences have the same shape
+        groups = {}
+        for request in batch:
+            groups.setdefault(request[0].shape[1:], []).append(request)
+
+        for requests in groups.values():
+            try:
+                inputs = np.concatenate([x for x, _, _ in requests]) if len(requests) > 1 else requests[0][0]
+                outputs = np.asarray(self._predict(inputs))
+            except Exception as e:
+                for _, future, _ in requests:
+                    future.set_exception(e)
+                continue
+
+            start = 0
+            for x, future, _ in requests:
+                future.set_result(outputs[start:start + len(x)])
+                start += len(x)
+
+            with self.lock:
+                self.stats['batches'] += 1
+                self.stats['requests'] += len(requests)
+                self.stats['rows'] += len(inputs)
+                self.stats['max_batch_rows'] = max(self.stats['max_batch_rows'], len(inputs))
+                self.stats['wait_seconds'] += sum(started - queued for _, _, queued in requests)
+
+    def metrics(self):
+        """
+        Queue depth and batching statistics since the worker started.
+
+        :return: Dictionary of metric name to value.
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        batches = stats['batches'] or 1
+        requests = stats['requests'] or 1
+        return {
+            'queue_depth': self.requests.qsize(),
+            'max_queue_depth': stats['max_queue_depth'],
+            'requests': stats['requests'],
+            'batches': stats['batches'],
+            'mean_batch_rows': stats['rows'] / batches,
+            'mean_requests_per_batch': stats['requests'] / batches,
+            'max_batch_rows': stats['max_batch_rows'],
+            'mean_queue_wait_ms': 1000 * stats['wait_seconds'] / requests,
+        }
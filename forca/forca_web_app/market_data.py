@@ -0,0 +1,326 @@
+"""
+Market data for every page, behind one provider interface and one shared cache.
+
+The provider is chosen with FORCA_MARKET_DATA:
+
+    yfinance              download from Yahoo Finance (default)
+    fixture:<folder>      read <TICKER>.csv or <TICKER>.parquet files from a local folder,
+                          for benchmarks and load tests without network access
+
+Pages read history through an in-memory cache limited to FORCA_HISTORY_CACHE_MB megabytes
+(256 by default).
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from price_store import COLUMNS, PriceStore
+from upstream import YAHOO
+
+# Memory budget of the in-memory history cache
+HISTORY_CACHE_BYTES = int(float(os.environ.get('FORCA_HISTORY_CACHE_MB', 256)) * 1024 * 1024)
+# Columns the history cache holds as float32, Volume stays float64
+PRICE_COLUMNS = [column for column in COLUMNS if column != 'Volume']
+
+
+class MarketDataProvider:
+    """
+    Source of daily bars. Subclasses implement history.
+    """
+
+    # Folder of the local price store that keeps this provider's data
+    store_folder = None
+
+    def history(self, ticker, start, end):
+        """
+        Return daily bars for a ticker.
+
+        :param ticker: Ticker symbol.
+        :param start: First date.
+        :param end: Date to stop before.
+        :return: DataFrame with Open, High, Low, Close and Volume indexed by a timezone-naive date.
+        """
+        raise NotImplementedError
+
+    def quotes(self, symbols):
+        """
+        Return the latest price of every symbol.
+
+        :param symbols: Iterable of ticker symbols.
+        :return: Series of last prices indexed by symbol, NaN for symbols without a price.
+        """
+        raise NotImplementedError
+
+    def info(self, ticker):
+        """
+        Return the company profile and key figures of a ticker.
+
+        :param ticker: Ticker symbol.
+        :return: Dictionary in the shape of yfinance's Ticker.info, empty when nothing is known.
+        """
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Daily bars downloaded from Yahoo Finance.
+    """
+
+    store_folder = 'prices'
+
+    def history(self, ticker, start, end):
+        import yfinance as yf
+        from yfinance.exceptions import YFInvalidPeriodError, YFTickerMissingError
+
+        def download():
+            # yf.download logs failed requests and returns an empty frame, Ticker.history raises
+            # transport, HTTP and rate limit errors with raise_errors, so the breaker counts them
+            try:
+                data = yf.Ticker(ticker).history(start=start, end=end, actions=False, raise_errors=True)
+            except (YFTickerMissingError, YFInvalidPeriodError) as e:
+                # An unknown ticker or a range without trading days is this request's problem, not
+                # an outage, and must not open the breaker every session shares
+                print(f"No prices for {ticker} from {start} to {end}: {e}")
+                return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+            if getattr(data.index, 'tz', None) is not None:
+                data.index = data.index.tz_localize(None)
+            return data
+
+        # Sessions asking for the same range at the same time share one download
+        return YAHOO.call(('history', ticker, str(start), str(end)), download)
+
+    def quotes(self, symbols):
+        import yfinance as yf
+
+        symbols = list(symbols)
+        # One request for every symbol, a few days back so weekends and holidays still have a close.
+        # Symbols yfinance could not download come back empty and are left out below.
+        data = YAHOO.call(('quotes', tuple(symbols)), lambda: yf.download(symbols, period='5d', group_by='ticker', progress=False))
+        prices = {}
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                close = data[symbol]['Close']
+            else:
+                close = data['Close']
+            close = close.dropna()
+            if not close.empty:
+                prices[symbol] = close.iloc[-1]
+        return pd.Series(prices, index=symbols, dtype='float64')
+
+    def info(self, ticker):
+        import yfinance as yf
+
+        return YAHOO.call(('info', ticker), lambda: yf.Ticker(ticker).info) or {}
+
+
+class FixtureProvider(MarketDataProvider):
+    """
+    Daily bars read from a folder of <TICKER>.csv or <TICKER>.parquet files, and company info
+    from <TICKER>.json files in the same folder.
+    """
+
+    store_folder = 'prices-fixture'
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.frames = {}
+        self.lock = threading.Lock()
+
+    def _load(self, ticker):
+        with self.lock:
+            if ticker not in self.frames:
+                parquet_path = os.path.join(self.folder, f"{ticker}.parquet")
+                csv_path = os.path.join(self.folder, f"{ticker}.csv")
+                if os.path.exists(parquet_path):
+                    df = pd.read_parquet(parquet_path)
+                elif os.path.exists(csv_path):
+                    df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+                else:
+                    df = pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+                self.frames[ticker] = df.sort_index()
+            return self.frames[ticker]
+
+    def history(self, ticker, start, end):
+        df = self._load(ticker)
+        return df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+    def quotes(self, symbols):
+        symbols = list(symbols)
+        prices = {}
+        for symbol in symbols:
+            close = self._load(symbol)['Close'].dropna()
+            if not close.empty:
+                prices[symbol] = close.iloc[-1]
+        return pd.Series(prices, index=symbols, dtype='float64')
+
+    def info(self, ticker):
+        try:
+            with open(os.path.join(self.folder, f"{ticker}.json")) as f:
+                return json.load(f)
+        except OSError:
+            return {}
+
+
+def create_provider(spec=None):
+    """
+    Create the provider described by spec, or by FORCA_MARKET_DATA when spec is None.
+
+    :param spec: 'yfinance' or 'fixture:<folder>'.
+    :return: MarketDataProvider.
+    """
+    spec = spec or os.environ.get('FORCA_MARKET_DATA', 'yfinance')
+    if spec == 'yfinance':
+        return YFinanceProvider()
+    if spec.startswith('fixture:'):
+        return FixtureProvider(spec[len('fixture:'):])
+    raise ValueError(f"Unknown market data provider: {spec}")
+
+
+_provider = None
+_store = None
+_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    Return the process-wide market data provider.
+    """
+    global _provider
+    with _lock:
+        if _provider is None:
+            _provider = create_provider()
+    return _provider
+
+
+def get_price_store():
+    """
+    Return the process-wide local price store in front of the provider.
+
+    Each provider gets its own store folder, so fixture data never mixes with downloaded data.
+    """
+    global _store
+    provider = get_provider()
+    with _lock:
+        if _store is None:
+            _store = PriceStore(folder=provider.store_folder, fetch=provider.history)
+    return _store
+
+
+def quote_snapshot(symbols):
+    """
+    Return the latest prices of a set of symbols, fetched together in one request.
+
+    :param symbols: Iterable of ticker symbols, duplicates are fetched once.
+    :return: Series of last prices indexed by symbol, NaN for symbols without a price.
+    """
+    symbols = sorted(set(symbols))
+    if not symbols:
+        return pd.Series(dtype='float64')
+    return get_provider().quotes(symbols)
+
+
+class HistoryCache:
+    """
+    In-memory daily bars, one superset per ticker within a global memory budget. Prices are held
+    as float32 and Volume as float64, whose counts float32 would round.
+
+    A request inside the date range already held for a ticker is served as a slice of it. A request
+    outside that range loads the union of both ranges from the price store and replaces the entry.
+    The least recently used tickers are dropped once the entries take more than max_bytes.
+
+    :param load: Function (ticker, start, end) returning daily bars, normally PriceStore.get.
+    :param max_bytes: Memory budget for all entries together.
+    """
+
+    def __init__(self, load, max_bytes=HISTORY_CACHE_BYTES):
+        self.load = load
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Ticker to (covered start, covered end, dates, prices, volume), least recently used first
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+    def _slice(self, dates, prices, volume, start, end):
+        lo, hi = np.searchsorted(dates, [start.to_datetime64(), end.to_datetime64()])
+        df = pd.DataFrame(prices[lo:hi], index=pd.DatetimeIndex(dates[lo:hi], name='Date'), columns=PRICE_COLUMNS, copy=False)
+        df['Volume'] = volume[lo:hi]
+        return df
+
+    @staticmethod
+    def _nbytes(entry):
+        return sum(array.nbytes for array in entry[2:])
+
+    def get(self, ticker, start, end):
+        """
+        Return the daily bars of a ticker from start up to (not including) end.
+
+        :return: DataFrame with COLUMNS indexed by Date, prices as float32 sharing read-only memory with the cache.
+        """
+        start = pd.Timestamp(start).normalize()
+        # Today's bar is not final yet, asking past today would load it again on every call
+        end = min(pd.Timestamp(end).normalize(), pd.Timestamp.today().normalize())
+        with self.lock:
+            entry = self.entries.get(ticker)
+            if entry and entry[0] <= start and end <= entry[1]:
+                self.entries.move_to_end(ticker)
+                return self._slice(*entry[2:], start, end)
+
+        load_start, load_end = (min(start, entry[0]), max(end, entry[1])) if entry else (start, end)
+        df = self.load(ticker, load_start, load_end)
+        dates = pd.DatetimeIndex(df.index).values.astype('datetime64[ns]')
+        prices = df.reindex(columns=PRICE_COLUMNS).to_numpy(dtype=np.float32)
+        volume = df.reindex(columns=['Volume']).to_numpy(dtype=np.float64)[:, 0]
+        # Pages get views of these arrays, read-only keeps one page from changing another's data
+        for array in (dates, prices, volume):
+            array.flags.writeable = False
+        covered_start, covered_end = load_start, load_end
+        if 'covered' in df.attrs:
+            # The price store may have fetched less than was asked for, those dates are asked again next time
+            if df.attrs['covered'] is None:
+                return self._slice(dates, prices, volume, start, end)
+            covered_start = max(covered_start, df.attrs['covered'][0])
+            covered_end = min(covered_end, df.attrs['covered'][1])
+
+        with self.lock:
+            old = self.entries.pop(ticker, None)
+            if old:
+                self.bytes -= self._nbytes(old)
+            entry = self.entries[ticker] = (covered_start, covered_end, dates, prices, volume)
+            self.bytes += self._nbytes(entry)
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= self._nbytes(evicted)
+        return self._slice(dates, prices, volume, start, end)
+
+
+_history_cache = None
+
+
+def get_history_cache():
+    """
+    Return the process-wide in-memory history cache in front of the local price store.
+    """
+    global _history_cache
+    store = get_price_store()
+    with _lock:
+        if _history_cache is None:
+            _history_cache = HistoryCache(store.get)
+    return _history_cache
+
+
+def load_history(ticker, start, end):
+    """
+    Return daily bars for a ticker, shared by every page.
+
+    :param ticker: Ticker symbol.
+    :param start: First date.
+    :param end: Date to stop before.
+    :return: DataFrame with Open, High, Low and Close as float32 and Volume as float64 indexed by Date.
+    """
+    return get_history_cache().get(ticker, start, end)
@@ -0,0 +1,174 @@
+"""
+Versioned database schema.
+
+Every migration runs once per database, in its own transaction, and is recorded in the
+schema_version table. The app applies pending migrations the first time a process starts. To
+apply or inspect them by hand, run from the forca_web_app folder:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied and pending migrations
+
+Add a change to the schema by appending a new (version, description, statements) entry to
+MIGRATIONS, never by editing an entry that has been applied.
+"""
+import argparse
+import threading
+
+from database import db_transaction
+
+MIGRATIONS = [
+    (1, "Create the users, demo_accounts and transactions tables", [
+        "CREATE TABLE IF NOT EXISTS users (id SERIAL PRIMARY KEY, email VARCHAR(100) NOT NULL);",
+        "CREATE TABLE IF NOT EXISTS demo_accounts (demo_id SERIAL PRIMARY KEY, allocated_amount DECIMAL(10, 2) NOT NULL, user_id INT NOT NULL, FOREIGN KEY (user_id) REFERENCES users(id));",
+        "CREATE TABLE IF NOT EXISTS transactions (transaction_id SERIAL PRIMARY KEY, transaction_type VARCHAR(5) NOT NULL CHECK (transaction_type IN ('BUY', 'SELL')), stock_symbol VARCHAR(10) NOT NULL, quantity INT NOT NULL, price DECIMAL(10, 2) NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, demo_id INT NOT NULL, status VARCHAR(10) NOT NULL DEFAULT 'OPEN' CHECK (status IN ('OPEN', 'CLOSED')), FOREIGN KEY (demo_id) REFERENCES demo_accounts(demo_id));",
+    ]),
+    (2, "Index the columns the pages look rows up by", [
+        # Registration did not stop a second user with the same email or a second demo account per user,
+        # which the unique indexes below would fail on. The oldest row is kept, the rows pointing at
+        # a duplicate are moved to it and a duplicate account's balance is added to the kept one.
+        """
+        UPDATE demo_accounts d SET user_id = u.keep_id
+        FROM (SELECT id, MIN(id) OVER (PARTITION BY email) AS keep_id FROM users) u
+        WHERE d.user_id = u.id AND u.id <> u.keep_id;
+        """,
+        "DELETE FROM users u USING users k WHERE u.email = k.email AND u.id > k.id;",
+        """
+        UPDATE transactions t SET demo_id = d.keep_id
+        FROM (SELECT demo_id, MIN(demo_id) OVER (PARTITION BY user_id) AS keep_id FROM demo_accounts) d
+        WHERE t.demo_id = d.demo_id AND d.demo_id <> d.keep_id;
+        """,
+        # The moved open positions took their margin from the duplicate's balance and return it on close
+        """
+        UPDATE demo_accounts k SET allocated_amount = k.allocated_amount + d.total
+        FROM (
+            SELECT keep_id, SUM(allocated_amount) AS total
+            FROM (SELECT demo_id, allocated_amount, MIN(demo_id) OVER (PARTITION BY user_id) AS keep_id FROM demo_accounts) accounts
+            WHERE demo_id <> keep_id
+            GROUP BY keep_id
+        ) d
+        WHERE k.demo_id = d.keep_id;
+        """,
+        "DELETE FROM demo_accounts d USING demo_accounts k WHERE d.user_id = k.user_id AND d.demo_id > k.demo_id;",
+        # Login and registration look users up by email, and an email belongs to one user
+        "CREATE UNIQUE INDEX IF NOT EXISTS users_email_key ON users (email);",
+        # Every page finds the demo account by user, and a user has one demo account
+        "CREATE UNIQUE INDEX IF NOT EXISTS demo_accounts_user_id_key ON demo_accounts (user_id);",
+        # Open trades and current holdings
+        "CREATE INDEX IF NOT EXISTS transactions_demo_id_status_idx ON transactions (demo_id, status);",
+        # Transaction history and the streak calendar
+        "CREATE INDEX IF NOT EXISTS transactions_demo_id_timestamp_idx ON transactions (demo_id, timestamp);",
+    ]),
+    (3, "Keep the totals of the open transactions per demo account and symbol in positions", [
+        # Maintained by the order statements in orders.py, see there for the columns
+        "CREATE TABLE IF NOT EXISTS positions (demo_id INT NOT NULL REFERENCES demo_accounts(demo_id), stock_symbol VARCHAR(10) NOT NULL, net_quantity INT NOT NULL, cost_basis DECIMAL(16, 4) NOT NULL, average_price DECIMAL(16, 4), margin DECIMAL(16, 4) NOT NULL, open_trades INT NOT NULL, updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (demo_id, stock_symbol));",
+        # Backfill from the open transactions, with the 10% margin orders.py used when this was written
+        """
+        INSERT INTO positions (demo_id, stock_symbol, net_quantity, cost_basis, average_price, margin, open_trades)
+        SELECT demo_id, stock_symbol, net_quantity, cost_basis, cost_basis / NULLIF(net_quantity, 0), margin, open_trades
+        FROM (
+            SELECT demo_id, stock_symbol,
+                   SUM(CASE WHEN transaction_type = 'BUY' THEN quantity ELSE -quantity END) AS net_quantity,
+                   SUM(CASE WHEN transaction_type = 'BUY' THEN quantity ELSE -quantity END * price) AS cost_basis,
+                   SUM(price * quantity * 10 / 100) AS margin,
+                   COUNT(*) AS open_trades
+            FROM transactions
+            WHERE status = 'OPEN'
+            GROUP BY demo_id, stock_symbol
+        ) open_totals
+        ON CONFLICT (demo_id, stock_symbol) DO NOTHING;
+        """,
+    ]),
+    (4, "Index the transaction history by timestamp and ID for keyset pagination", [
+        "CREATE INDEX IF NOT EXISTS transactions_demo_id_timestamp_id_idx ON transactions (demo_id, timestamp, transaction_id);",
+        # The new index starts with the same columns, so it serves the streak calendar too
+        "DROP INDEX IF EXISTS transactions_demo_id_timestamp_idx;",
+    ]),
+]
+
+# Arbitrary key for the advisory lock that keeps two processes from migrating at the same time
+MIGRATION_LOCK_KEY = 724_001
+
+_applied = False
+_applied_lock = threading.Lock()
+
+
+def _create_version_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def applied_versions():
+    """
+    :return: Set of the migration versions recorded in schema_version.
+    """
+    with db_transaction() as conn, conn.cursor() as cur:
+        _create_version_table(cur)
+        cur.execute("SELECT version FROM schema_version;")
+        return {row[0] for row in cur.fetchall()}
+
+
+def run_migrations():
+    """
+    Apply every migration that is not recorded in schema_version yet, in version order.
+
+    Each migration and its schema_version row are committed together, so a failed migration leaves
+    nothing behind and is tried again on the next start.
+
+    :return: List of the versions applied by this call.
+    """
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        with db_transaction() as conn, conn.cursor() as cur:
+            # Held until the transaction ends, other processes wait here and then skip what was applied
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_KEY,))
+            _create_version_table(cur)
+            cur.execute("SELECT 1 FROM schema_version WHERE version = %s;", (version,))
+            if cur.fetchone():
+                continue
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s);", (version, description))
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+def ensure_schema():
+    """
+    Apply pending migrations once per process. Later calls return immediately.
+    """
+    global _applied
+    if _applied:
+        return
+    with _applied_lock:
+        if _applied:
+            return
+        try:
+            run_migrations()
+            _applied = True
+        except Exception as e:
+            # The next rerun tries again
+            print(f"Database migration failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply the database migrations.')
+    parser.add_argument('--status', action='store_true', help='List applied and pending migrations without applying any.')
+    args = parser.parse_args()
+
+    if args.status:
+        applied = applied_versions()
+        for version, description, _ in MIGRATIONS:
+            print(f"{'applied' if version in applied else 'pending'}  {version}  {description}")
+    else:
+        applied = run_migrations()
+        print(f"Applied {len(applied)} migration(s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Versioned model registry with background warm-up and atomic hot swaps.
+
+Without FORCA_MODEL_DIR the registry serves the single model at FORCA_MODEL_PATH (the shipped
+my_lstm_model.keras by default). With FORCA_MODEL_DIR it serves <version>.keras files from that
+folder, and the file ACTIVE names the version in use. Publish and activate versions from the
+forca_web_app folder with:
+
+    python model_registry.py publish path/to/new_model.keras --version 2024-06-01 --activate
+    python model_registry.py activate 2024-06-01
+    python model_registry.py list
+"""
+import argparse
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from forecast_cache import file_hash
+from forecasting import MODEL_BACKEND, SEQUENCE_LENGTH, load_forecast_model
+from inference_server import MicroBatcher
+from storage import atomic_write
+
+MODEL_PATH = os.environ.get('FORCA_MODEL_PATH', os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'my_lstm_model.keras')))
+MODEL_DIR = os.environ.get('FORCA_MODEL_DIR')
+
+# How often (in seconds) the registry checks whether the active model was replaced on disk
+CHECK_INTERVAL = 10
+
+
+class ActiveModel:
+    """
+    A loaded and warmed up model version. Callers keep using the instance they got even if a
+    newer version is activated while their request is running.
+    """
+
+    def __init__(self, version, path, backend):
+        self.version = version
+        self.path = path
+        self.hash = file_hash(path)
+        self.model = load_forecast_model(path, backend)
+        # A dummy prediction loads the weights into memory and traces the Keras graph
+        self.model.predict(np.zeros((1, SEQUENCE_LENGTH, 1), dtype=np.float32), verbose=0)
+        self.batcher = MicroBatcher(self.model)
+
+    def close(self):
+        """
+        Stop the inference worker once the requests already queued on it are answered.
+
+        Callers still holding this version afterwards run their predictions without batching.
+        """
+        self.batcher.close()
+
+
+class ModelRegistry:
+    """
+    Keeps track of the model versions on disk and the one currently serving predictions.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, model_path=MODEL_PATH, backend=MODEL_BACKEND):
+        self.model_dir = model_dir
+        self.model_path = model_path
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.swap_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.active = None
+        self.last_check = 0.0
+
+    def versions(self):
+        """
+        :return: Sorted list of the available version names.
+        """
+        if not self.model_dir:
+            return ['default']
+        if not os.path.isdir(self.model_dir):
+            return []
+        return sorted(name[:-len('.keras')] for name in os.listdir(self.model_dir) if name.endswith('.keras'))
+
+    def active_version(self):
+        """
+        :return: Name of the version that should be serving, as recorded on disk.
+        """
+        if not self.model_dir:
+            return 'default'
+        try:
+            with open(os.path.join(self.model_dir, 'ACTIVE')) as f:
+                return f.read().strip()
+        except OSError:
+            versions = self.versions()
+            return versions[-1] if versions else None
+
+    def path_for(self, version):
+        """
+        :return: Path to the model file of a version.
+        """
+        if not self.model_dir:
+            return self.model_path
+        return os.path.join(self.model_dir, f"{version}.keras")
+
+    def start_warmup(self):
+        """
+        Load and warm up the active version in a background thread, so no user request pays for it.
+        """
+        threading.Thread(target=self._warm_up, name='model-warmup', daemon=True).start()
+
+    def _warm_up(self):
+        try:
+            with self.swap_lock:
+                self._swap_to(self.active_version())
+        except Exception as e:
+            print(f"Model warm-up failed: {e}")
+        finally:
+            self.ready.set()
+
+    def _swap_to(self, version):
+        """
+        Load a version fully before replacing the active model in one reference assignment.
+        """
+        if version is None:
+            raise FileNotFoundError(f"No model versions found in {self.model_dir}")
+        loaded = ActiveModel(version, self.path_for(version), self.backend)
+        with self.lock:
+            replaced, self.active = self.active, loaded
+        print(f"Model version {version} is active ({loaded.path})")
+        if replaced is not None:
+            # Frees the worker thread, the old weights go once the last request using them is done
+            replaced.close()
+        return loaded
+
+    def get(self, timeout=None):
+        """
+        Return the active model, waiting for the warm-up if it is still running.
+
+        Every CHECK_INTERVAL seconds this also checks whether the ACTIVE pointer or the model file
+        changed on disk. A changed version is loaded in the background and swapped in once it is
+        warm, requests keep being served by the current version until then.
+
+        :param timeout: Seconds to wait for the warm-up, None to wait as long as it takes.
+        :return: ActiveModel.
+        """
+        if self.active is None:
+            if not self.ready.wait(timeout):
+                raise TimeoutError("The model is still warming up.")
+            if self.active is None:
+                # The warm-up failed, retry in the calling thread so the error reaches the page
+                with self.swap_lock:
+                    if self.active is None:
+                        return self._swap_to(self.active_version())
+
+        now = time.monotonic()
+        if now - self.last_check >= CHECK_INTERVAL:
+            self.last_check = now
+            threading.Thread(target=self._swap_if_changed, name='model-swap', daemon=True).start()
+        return self.active
+
+    def _swap_if_changed(self):
+        # Only one swap at a time, a check that finds a swap running has nothing to do
+        if not self.swap_lock.acquire(blocking=False):
+            return
+        version = None
+        try:
+            version = self.active_version()
+            current = self.active
+            if version != current.version or file_hash(self.path_for(version)) != current.hash:
+                self._swap_to(version)
+        except Exception as e:
+            print(f"Could not switch to model version {version}: {e}")
+        finally:
+            self.swap_lock.release()
+
+    def publish(self, source_path, version, activate=False):
+        """
+        Copy a model file into the registry as a new version.
+
+        :param source_path: Path to the .keras file.
+        :param version: Name of the new version.
+        :param activate: Also make the new version the active one.
+        """
+        if not self.model_dir:
+            raise ValueError("Set FORCA_MODEL_DIR to publish model versions.")
+        destination = self.path_for(version)
+        with open(source_path, 'rb') as source:
+            atomic_write(destination, lambda f: shutil.copyfileobj(source, f))
+        if activate:
+            self.activate(version)
+
+    def activate(self, version):
+        """
+        Record a version as active. Running servers pick it up within CHECK_INTERVAL seconds.
+        """
+        if not self.model_dir:
+            raise ValueError("Set FORCA_MODEL_DIR to activate model versions.")
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version {version}")
+        atomic_write(os.path.join(self.model_dir, 'ACTIVE'), lambda f: f.write(version), mode='w')
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Return the process-wide registry, starting the model warm-up the first time it is called.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+            _registry.start_warmup()
+    return _registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the model versions in FORCA_MODEL_DIR.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='List the available versions.')
+    publish = commands.add_parser('publish', help='Add a model file as a new version.')
+    publish.add_argument('path')
+    publish.add_argument('--version', default=time.strftime('%Y%m%d-%H%M%S'))
+    publish.add_argument('--activate', action='store_true')
+    activate = commands.add_parser('activate', help='Make a version the active one.')
+    activate.add_argument('version')
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    if args.command == 'list':
+        active = registry.active_version()
+        for version in registry.versions():
+            print(f"{'*' if version == active else ' '} {version}")
+    elif args.command == 'publish':
+        registry.publish(args.path, args.version, args.activate)
+        print(f"Published {args.path} as version {args.version}")
+    else:
+        registry.activate(args.version)
+        print(f"Version {args.version} is now active")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Alpha Vantage NEWS_SENTIMENT articles, cached per ticker and kept within the API quota.
+
+The free Alpha Vantage plan allows only a handful of requests per minute and per day, so every
+request first takes a token from both rate limits. Without a token, or when Alpha Vantage reports
+the quota as used up, the last saved articles are served even if they are older than the TTL.
+
+FORCA_NEWS_TTL                  seconds a ticker's articles stay fresh (default 1800)
+ALPHA_VANTAGE_API_KEY           API key
+ALPHA_VANTAGE_PER_MINUTE        requests allowed per minute (default 5)
+ALPHA_VANTAGE_PER_DAY           requests allowed per day (default 25)
+"""
+import json
+import os
+import threading
+import time
+
+import requests
+
+from storage import atomic_write, cache_path
+from upstream import ALPHA_VANTAGE
+
+NEWS_URL = "https://www.alphavantage.co/query"
+API_KEY = os.environ.get('ALPHA_VANTAGE_API_KEY', "SY6VYHGY5D4SITEN")
+NEWS_TTL = float(os.environ.get('FORCA_NEWS_TTL', 30 * 60))
+PER_MINUTE = int(os.environ.get('ALPHA_VANTAGE_PER_MINUTE', 5))
+PER_DAY = int(os.environ.get('ALPHA_VANTAGE_PER_DAY', 25))
+
+# Articles kept per ticker, the dashboard shows the first five
+MAX_ARTICLES = 10
+
+
+class TokenBucket:
+    """
+    Allows capacity requests at once and refills one token every period / capacity seconds.
+
+    :param capacity: Maximum number of tokens.
+    :param period: Seconds to refill the whole bucket.
+    """
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """
+        Take a token if one is available.
+
+        :return: True if a token was taken.
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def release(self):
+        """
+        Give back a token taken for a request that was never sent.
+        """
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+def parse_articles(news_json):
+    """
+    Keep only the fields the dashboard shows.
+
+    :param news_json: NEWS_SENTIMENT response.
+    :return: List of dictionaries with title, summary and url.
+    """
+    return [
+        {'title': article.get('title', ''), 'summary': article.get('summary', ''), 'url': article.get('url', '')}
+        for article in news_json.get('feed', [])[:MAX_ARTICLES]
+    ]
+
+
+class NewsCache:
+    """
+    Parsed articles per ticker in memory and on disk.
+
+    :param ttl: Seconds the articles of a ticker stay fresh.
+    :param limits: Token buckets a request has to pass, defaults to the per-minute and per-day quota.
+    :param folder: Folder inside the cache folder for the JSON files.
+    :param api_key: Alpha Vantage API key.
+    """
+
+    def __init__(self, ttl=NEWS_TTL, limits=None, folder='news', api_key=API_KEY):
+        self.ttl = ttl
+        self.limits = limits if limits is not None else [TokenBucket(PER_MINUTE, 60), TokenBucket(PER_DAY, 24 * 60 * 60)]
+        self.folder = os.path.dirname(cache_path(folder, 'index'))
+        self.api_key = api_key
+        self.lock = threading.Lock()
+        self.ticker_locks = {}
+        # Ticker to {'fetched_at': time.time(), 'articles': [...]}
+        self.entries = {}
+
+    def _ticker_lock(self, ticker):
+        with self.lock:
+            return self.ticker_locks.setdefault(ticker, threading.Lock())
+
+    def _path(self, ticker):
+        return os.path.join(self.folder, f"{ticker.replace('/', '_')}.json")
+
+    def _read_disk(self, ticker):
+        try:
+            with open(self._path(ticker)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _acquire(self):
+        """
+        Take a token from every limit, or from none of them.
+        """
+        taken = []
+        for bucket in self.limits:
+            if not bucket.try_acquire():
+                for other in taken:
+                    other.release()
+                return False
+            taken.append(bucket)
+        return True
+
+    # The process of fetching the news data from the ALPHA VANTAGE API was generated by ChatGPT. The specific prompts will be detailed in the final report
+    def _fetch(self, ticker, timeout):
+        params = {
+            "function": "NEWS_SENTIMENT",
+            "tickers": ticker,
+            "apikey": self.api_key
+        }
+        news_json = ALPHA_VANTAGE.call(('news', ticker), lambda: requests.get(NEWS_URL, params=params, timeout=timeout).json())
+        if 'feed' not in news_json:
+            # Alpha Vantage answers a used up quota with a message instead of an HTTP error
+            raise RuntimeError(news_json.get('Information') or news_json.get('Note') or 'Alpha Vantage returned no news feed.')
+        return parse_articles(news_json)
+
+    def get(self, ticker, timeout=10):
+        """
+        Return the articles of a ticker, fetching them when the cached ones are older than the TTL.
+
+        Concurrent requests for the same ticker share one API call.
+
+        :param ticker: Ticker symbol.
+        :param timeout: Seconds to wait for Alpha Vantage.
+        :return: Dictionary with articles, fetched_at and stale (True when the TTL has passed).
+        :raises RuntimeError: If there is no saved copy and no new one could be fetched.
+        """
+        entry = self.entries.get(ticker)
+        if entry and time.time() - entry['fetched_at'] < self.ttl:
+            return dict(entry, stale=False)
+
+        with self._ticker_lock(ticker):
+            # Another request may have fetched the ticker while this one waited
+            entry = self.entries.get(ticker) or self._read_disk(ticker)
+            if entry and time.time() - entry['fetched_at'] < self.ttl:
+                self.entries[ticker] = entry
+                return dict(entry, stale=False)
+
+            error = None
+            if self._acquire():
+                try:
+                    entry = {'fetched_at': time.time(), 'articles': self._fetch(ticker, timeout)}
+                    atomic_write(self._path(ticker), lambda f: json.dump(entry, f), mode='w')
+                    self.entries[ticker] = entry
+                    return dict(entry, stale=False)
+                except Exception as e:
+                    error = e
+            else:
+                error = RuntimeError("The Alpha Vantage request limit is reached.")
+
+            if entry:
+                print(f"Serving saved news for {ticker}: {error}")
+                self.entries[ticker] = entry
+                return dict(entry, stale=True)
+            raise RuntimeError(f"No news available for {ticker}: {error}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_news_cache():
+    """
+    Return the process-wide news cache, so every session shares one quota.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = NewsCache()
+    return _cache
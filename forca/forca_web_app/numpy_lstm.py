@@ -0,0 +1,157 @@
+import json
+import os
+import re
+import zipfile
+
+import numpy as np
+
+from forecast_cache import file_hash
+
+
+def _snake_case(name):
+    """
+    Convert a Keras class name to the snake_case name Keras uses for its weight groups (LSTM -> lstm).
+    """
+    name = re.sub(r'(.)([A-Z][a-z]+)', r'\1_\2', name)
+    return re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', name).lower()
+
+
+def _sigmoid(x):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+class NumpyLSTM:
+    """
+    Inference-only copy of the single layer LSTM -> Dropout -> Dense model, evaluated with NumPy.
+
+    The predict method accepts the same input as the Keras model, so it can be used in its place
+    without importing TensorFlow.
+    """
+
+    def __init__(self, kernel, recurrent_kernel, bias, dense_kernel, dense_bias):
+        self.kernel = np.ascontiguousarray(kernel, dtype=np.float32)
+        self.recurrent_kernel = np.ascontiguousarray(recurrent_kernel, dtype=np.float32)
+        self.bias = np.ascontiguousarray(bias, dtype=np.float32)
+        self.dense_kernel = np.ascontiguousarray(dense_kernel, dtype=np.float32)
+        self.dense_bias = np.ascontiguousarray(dense_bias, dtype=np.float32)
+        self.units = self.recurrent_kernel.shape[0]
+
+    def predict(self, x, batch_size=None, verbose=0):
+        """
+        Run the forward pass for a batch of sequences.
+
+        :param x: Array of shape (batch, timesteps, features).
+        :param batch_size: Ignored, accepted for compatibility with the Keras predict signature.
+        :param verbose: Ignored, accepted for compatibility with the Keras predict signature.
+        :return: Predictions of shape (batch, 1).
+        """
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[..., None]
+        batch = x.shape[0]
+        units = self.units
+
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        for t in range(x.shape[1]):
+            # Keras stores the gates in the order input, forget, cell, output
+            z = x[:, t] @ self.kernel + h @ self.recurrent_kernel + self.bias
+            i = _sigmoid(z[:, :units])
+            f = _sigmoid(z[:, units:2 * units])
+            g = np.tanh(z[:, 2 * units:3 * units])
+            o = _sigmoid(z[:, 3 * units:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+
+        # Dropout is a no-op at inference time, so the LSTM output goes straight into the Dense layer
+        return h @ self.dense_kernel + self.dense_bias
+
+    def save(self, path, source_hash=''):
+        """
+        Save the weights as an uncompressed .npz file.
+
+        :param path: Path to write.
+        :param source_hash: Hash of the model file the weights were read from, stored alongside them.
+        """
+        np.savez(path, kernel=self.kernel, recurrent_kernel=self.recurrent_kernel, bias=self.bias,
+                 dense_kernel=self.dense_kernel, dense_bias=self.dense_bias, source_hash=np.array(source_hash))
+
+    @classmethod
+    def from_npz(cls, path):
+        """
+        Load weights previously written by save.
+        """
+        with np.load(path) as weights:
+            return cls(weights['kernel'], weights['recurrent_kernel'], weights['bias'],
+                       weights['dense_kernel'], weights['dense_bias'])
+
+    @classmethod
+    def from_keras_archive(cls, path):
+        """
+        Read the LSTM and Dense weights from a Keras 3 .keras archive.
+
+        Only h5py is needed for this, TensorFlow is never imported.
+
+        :param path: Path to the .keras file.
+        :return: NumpyLSTM with the archive's weights.
+        """
+        import h5py
+
+        with zipfile.ZipFile(path) as archive:
+            config = json.loads(archive.read('config.json'))
+            with archive.open('model.weights.h5') as weights_file, h5py.File(weights_file, 'r') as weights:
+                layers = {}
+                seen = {}
+                for layer in config['config']['layers']:
+                    class_name = layer['class_name']
+                    if class_name == 'InputLayer':
+                        continue
+                    # Weight groups are named after the layer class, with a counter for repeated classes
+                    group = _snake_case(class_name)
+                    count = seen.get(group, 0)
+                    seen[group] = count + 1
+                    layers.setdefault(class_name, []).append((layer['config'], f"layers/{group}_{count}" if count else f"layers/{group}"))
+
+                if sorted(layers) != ['Dense', 'Dropout', 'LSTM'] or len(layers['LSTM']) != 1 or len(layers['Dense']) != 1:
+                    raise ValueError(f"Unsupported model architecture in {path}: {sorted(layers)}")
+                lstm_config, lstm_group = layers['LSTM'][0]
+                dense_config, dense_group = layers['Dense'][0]
+                if (lstm_config['activation'], lstm_config['recurrent_activation']) != ('tanh', 'sigmoid') \
+                        or lstm_config['return_sequences'] or lstm_config['go_backwards'] \
+                        or dense_config['activation'] != 'linear':
+                    raise ValueError(f"Unsupported layer configuration in {path}")
+
+                cell = weights[f"{lstm_group}/cell/vars"]
+                dense = weights[f"{dense_group}/vars"]
+                return cls(cell['0'][()], cell['1'][()], cell['2'][()], dense['0'][()], dense['1'][()])
+
+
+def load_numpy_lstm(path):
+    """
+    Load a NumPy LSTM for the .keras file at path.
+
+    The weights are extracted once and cached next to the model as <path>.npz together with the
+    model file's hash, later loads read the cache as long as the hash matches. Modification times
+    are not compared because copies and checkouts can replace the model with an older one.
+
+    :param path: Path to the .keras file.
+    :return: NumpyLSTM model.
+    """
+    cache_path = path + '.npz'
+    source_hash = file_hash(path)
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as weights:
+                fresh = 'source_hash' in weights.files and str(weights['source_hash']) == source_hash
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable model weight cache {cache_path}: {e}")
+            fresh = False
+        if fresh:
+            return NumpyLSTM.from_npz(cache_path)
+
+    model = NumpyLSTM.from_keras_archive(path)
+    try:
+        model.save(cache_path, source_hash)
+    except OSError as e:
+        print(f"Could not cache model weights at {cache_path}: {e}")
+    return model
@@ -0,0 +1,201 @@
+"""
+Demo account order execution.
+
+Opening and closing a position are each one SQL statement: the demo account row is locked, the
+margin is checked, the transaction rows are written and the balance is changed together, so
+concurrent orders of the same user cannot spend the same margin twice.
+
+The same statements keep the positions table up to date. It holds one row per demo account and
+symbol with the totals of the open transactions, BUY quantities counting positive and SELL
+quantities negative:
+
+    net_quantity    sum of the signed quantities
+    cost_basis      sum of the signed quantity times price
+    average_price   cost_basis / net_quantity
+    margin          margin held by the open transactions
+    open_trades     number of open transactions
+"""
+import math
+import numbers
+
+from database import db_transaction
+
+# Margin percentage for both buy and sell positions
+MARGIN_PERCENTAGE = 10
+
+OPEN_POSITION_SQL = """
+    WITH account AS (
+        SELECT demo_id, allocated_amount
+        FROM demo_accounts
+        WHERE user_id = %(user_id)s
+        FOR UPDATE
+    ), debited AS (
+        UPDATE demo_accounts d
+        SET allocated_amount = d.allocated_amount - %(margin)s
+        FROM account a
+        WHERE d.demo_id = a.demo_id AND a.allocated_amount >= %(margin)s
+        RETURNING d.demo_id
+    ), inserted AS (
+        INSERT INTO transactions (transaction_type, stock_symbol, quantity, price, demo_id)
+        SELECT %(transaction_type)s, %(symbol)s, %(quantity)s, %(price)s, demo_id
+        FROM debited
+        RETURNING transaction_id, demo_id, stock_symbol,
+                  CASE WHEN transaction_type = 'BUY' THEN quantity ELSE -quantity END AS signed_quantity,
+                  price, quantity
+    ), position AS (
+        -- Data-modifying CTEs always run, whether or not the final SELECT reads them
+        INSERT INTO positions AS p (demo_id, stock_symbol, net_quantity, cost_basis, average_price, margin, open_trades)
+        SELECT demo_id, stock_symbol, signed_quantity, signed_quantity * price, price,
+               price * quantity * %(margin_percentage)s / 100, 1
+        FROM inserted
+        ON CONFLICT (demo_id, stock_symbol) DO UPDATE SET
+            net_quantity = p.net_quantity + EXCLUDED.net_quantity,
+            cost_basis = p.cost_basis + EXCLUDED.cost_basis,
+            average_price = (p.cost_basis + EXCLUDED.cost_basis) / NULLIF(p.net_quantity + EXCLUDED.net_quantity, 0),
+            margin = p.margin + EXCLUDED.margin,
+            open_trades = p.open_trades + 1,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    -- No row: no demo account, NULL transaction_id: the balance does not cover the margin
+    SELECT i.transaction_id
+    FROM account a
+    LEFT JOIN inserted i ON TRUE;
+"""
+
+CLOSE_POSITION_SQL = """
+    WITH account AS (
+        SELECT demo_id
+        FROM demo_accounts
+        WHERE user_id = %(user_id)s
+        FOR UPDATE
+    ), original AS (
+        UPDATE transactions t
+        SET status = 'CLOSED'
+        FROM account a
+        WHERE t.transaction_id = %(transaction_id)s
+          AND t.demo_id = a.demo_id
+          AND t.stock_symbol = %(symbol)s
+          AND t.status = 'OPEN'
+        RETURNING t.demo_id, t.transaction_type, t.stock_symbol, t.quantity, t.price,
+                  CASE WHEN t.transaction_type = 'BUY' THEN t.quantity ELSE -t.quantity END AS signed_quantity,
+                  CASE WHEN t.transaction_type = 'BUY' THEN %(price)s - t.price ELSE t.price - %(price)s END * t.quantity AS profit_loss
+    ), closing AS (
+        INSERT INTO transactions (transaction_type, stock_symbol, quantity, price, demo_id, status)
+        SELECT CASE WHEN transaction_type = 'BUY' THEN 'SELL' ELSE 'BUY' END, stock_symbol, quantity, %(price)s, demo_id, 'CLOSED'
+        FROM original
+        RETURNING transaction_type
+    ), credited AS (
+        -- Return the margin and add the profit or deduct the loss
+        UPDATE demo_accounts d
+        SET allocated_amount = d.allocated_amount + o.price * o.quantity * %(margin_percentage)s / 100 + o.profit_loss
+        FROM original o
+        WHERE d.demo_id = o.demo_id
+        RETURNING d.allocated_amount
+    ), position AS (
+        UPDATE positions p
+        SET net_quantity = p.net_quantity - o.signed_quantity,
+            cost_basis = p.cost_basis - o.signed_quantity * o.price,
+            average_price = (p.cost_basis - o.signed_quantity * o.price) / NULLIF(p.net_quantity - o.signed_quantity, 0),
+            margin = p.margin - o.price * o.quantity * %(margin_percentage)s / 100,
+            open_trades = p.open_trades - 1,
+            updated_at = CURRENT_TIMESTAMP
+        FROM original o
+        WHERE p.demo_id = o.demo_id AND p.stock_symbol = o.stock_symbol
+    )
+    SELECT c.transaction_type, o.quantity, o.profit_loss
+    FROM original o, closing c, credited cr;
+"""
+
+
+def price_error(price):
+    """
+    Check an order price before it reaches the database. A NaN price would otherwise be written to
+    the transaction and turn the balance into NaN when the position is closed.
+
+    :return: Message describing why the price is rejected, None if it is valid.
+    """
+    if not isinstance(price, numbers.Real) or not math.isfinite(price) or price <= 0:
+        return f"Invalid price: {price}"
+    return None
+
+
+def quantity_error(quantity):
+    """
+    :return: Message describing why the number of shares is rejected, None if it is valid.
+    """
+    if not isinstance(quantity, numbers.Integral) or quantity <= 0:
+        return f"Invalid quantity: {quantity}"
+    return None
+
+
+def margin_for(price, quantity):
+    """
+    :return: Margin a position of quantity shares at price takes from the balance.
+    """
+    return round(price * quantity * MARGIN_PERCENTAGE / 100, 2)
+
+
+def open_position(user_id, transaction_type, symbol, quantity, price):
+    """
+    Open a BUY or SELL position if the demo account balance covers its margin.
+
+    :param user_id: User ID.
+    :param transaction_type: 'BUY' or 'SELL'.
+    :param symbol: Stock ticker symbol.
+    :param quantity: Number of shares.
+    :param price: Price per share.
+    :return: Tuple showing success/failure and a message describing the outcome.
+    """
+    error = price_error(price) or quantity_error(quantity)
+    if error:
+        return False, error
+    # psycopg2 cannot adapt NumPy scalars, which is what the pages' quotes and inputs often are
+    price, quantity = float(price), int(quantity)
+    margin = margin_for(price, quantity)
+    try:
+        with db_transaction() as conn, conn.cursor() as cur:
+            cur.execute(OPEN_POSITION_SQL, {
+                'user_id': user_id, 'transaction_type': transaction_type, 'symbol': symbol,
+                'quantity': quantity, 'price': price, 'margin': margin,
+                'margin_percentage': MARGIN_PERCENTAGE,
+            })
+            row = cur.fetchone()
+    except Exception as e:
+        return False, f"Database operation failed: {str(e)}"
+
+    if row is None:
+        return False, "Demo account does not exist."
+    if row[0] is None:
+        return False, f"Insufficient balance to cover the margin required for this purchase. Margin required: ${margin}"
+    return True, f"Transaction successful: {transaction_type} {quantity} shares of {symbol} at ${price:.2f} each."
+
+
+def close_position(user_id, transaction_id, symbol, price):
+    """
+    Close an open position by recording the reverse transaction and returning its margin and profit or loss.
+
+    :param user_id: User ID, the position has to belong to this user's demo account.
+    :param transaction_id: ID of the transaction that opened the position.
+    :param symbol: Stock ticker symbol of the position, price has to be this stock's price.
+    :param price: Current price per share.
+    :return: Tuple showing success/failure and a message describing the outcome.
+    """
+    error = price_error(price)
+    if error:
+        return False, error
+    # psycopg2 cannot adapt NumPy scalars, the ID comes from a DataFrame row
+    price, transaction_id = float(price), int(transaction_id)
+    try:
+        with db_transaction() as conn, conn.cursor() as cur:
+            cur.execute(CLOSE_POSITION_SQL, {
+                'user_id': user_id, 'transaction_id': transaction_id, 'symbol': symbol,
+                'price': price, 'margin_percentage': MARGIN_PERCENTAGE,
+            })
+            row = cur.fetchone()
+    except Exception as e:
+        return False, f"Failed to close trade: {e}"
+
+    if row is None:
+        return False, "Original transaction not found or already closed."
+    reverse_type, quantity, profit_loss = row
+    return True, f"Trade closed successfully. Transaction type: {reverse_type}, Quantity: {quantity}, Price: ${price:.2f}, Profit/Loss: ${profit_loss:.2f}"
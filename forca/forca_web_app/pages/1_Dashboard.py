@@ -1,16 +1,22 @@
 from database import *
 from user import *
+from fanout import fan_out
+from fundamentals import get_fundamentals
+from news import get_news_cache
+from market_data import load_history
+from ticker_registry import get_ticker_universe
 #from pages.StockPrediction import show_stock_prediction
 
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 
-from bs4 import BeautifulSoup
-import requests
+# Seconds each dashboard source may take before its section shows an error
+HISTORY_TIMEOUT = 20
+COMPANY_NAME_TIMEOUT = 10
+NEWS_TIMEOUT = 10
 
 # Function to display the dashboard
 def display_dashboard():
@@ -31,127 +37,91 @@ def display_dashboard():
         start_date = st.sidebar.date_input("Start Date", pd.to_datetime('2020-01-01'))
         end_date = st.sidebar.date_input("End Date", pd.to_datetime('today'))
         
-        # Scrape S&P 500 tickers
-        sp500_tickers = scrape_sp500_tickers()
-
-        # options for the selectbox
-        options = [f"{ticker} - {company}" for ticker, company in sp500_tickers]
-        
-        # Sort options alphabetically by company name
-        options.sort()
+        # S&P 500 options, sorted once by the shared ticker registry
+        options = get_ticker_universe().options
+        if not options:
+            # The first scrape failed and there is no saved list yet, it is retried on a later rerun
+            st.error("The list of S&P 500 companies could not be loaded. Please try again in a minute.")
+            st.stop()
         selected_option = st.sidebar.selectbox("Select a company:", options)
         ticker_symbol = selected_option.split(" - ")[0]
         
         return start_date, end_date, ticker_symbol
     
-    @st.cache_data
     def get_company_name(symbol):
         """
         Retrieve the name of the company associated to the ticker symbol.
         """
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        return info.get('longName')
+        # The registry's Wikipedia name covers tickers without fundamentals
+        return get_fundamentals().get(symbol).get('longName') or get_ticker_universe().names.get(symbol)
     
-    @st.cache_data
-    def get_data(symbol, start, end):
-        """
-        Fetch historical stock price data for the ticker symbol between the start and end dates.
-        """
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period='1d', start=start, end=end)
-        df.reset_index(inplace=True)
-        return df
-    
-    # The process of scraping the sp500 data was taken from the Beautiful Soup package https://realpython.com/beautiful-soup-web-scraper-python/
-    @st.cache_data
-    def scrape_sp500_tickers():
-        """
-        Scrape S&P 500 ticker symbols and company names from Wikipedia.
-        """
-        
-        url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-        html = requests.get(url).text
-        soup = BeautifulSoup(html, 'html.parser')
-        table = soup.find('table', {'class': 'wikitable sortable'})
-
-        # Initialize an empty list to store tickers
-        tickers = []
-        
-        # Loop over each row in the table except the header row
-        for row in table.findAll('tr')[1:]:
-            ticker = row.findAll('td')[0].text.strip()
-            company_name = row.findAll('td')[1].text.strip()
-            tickers.append((ticker, company_name))
-        return tickers
-        
-
     # Retrieve user input
     start, end, symbol = get_input()
-    df = get_data(symbol, start, end)
-    company_name = get_company_name(symbol)
-        
 
-    # Displaying the stock information
-    company_name = get_company_name(symbol)
-    if company_name is None:
-        st.error("Failed to fetch company name.")
-        return  # Exit the function early since no fetch of the company name
-    st.header(company_name + " Stock Price\n")
-
-    # Using Plotly Express for the line chart
-    fig = px.line(df, x='Date', y='Close', labels={'Close': 'Closing Price'}, title=f"{company_name} Closing Price")
-    fig.update_xaxes(title_text='Date')
-    fig.update_yaxes(title_text='Closing Price (USD)')
-    st.plotly_chart(fig)
-
-
-    # Displaying metrics
-    st.header('Data Metrics')
-    st.metric(label="Closing Price", value=f"${df['Close'].iloc[-1]:.2f}")
-    st.metric(label="Volume", value=f"{df['Volume'].iloc[-1]}")
-    
-    # Fetch and display news based on user input symbol
-    st.title(f'Stock News from Alpha Vantage for {company_name}')
-
-    
-    # lines 118-147 (except the st. statements) The process of fetching the news data from the ALPHA VANTAGE API was generated by ChatGPT. The specific prompts will be detailed in the final report    
-    # Function to fetch news from Alpha Vantage
-    def get_alpha_vantage_news(api_key, symbol):
-        """
-        Fetch news articles related to the ticker symbol using the Alpha Vantage API.
-        """
-        base_url = "https://www.alphavantage.co/query" 
-        params = {
-            "function": "NEWS_SENTIMENT",
-            "tickers": symbol,
-            "apikey": api_key
-        }
-        # Send GET request to Alpha Vantage API
-        response = requests.get(base_url, params=params)
-        
-        # Return the JSON response
-        return response.json()
-
-    api_key = "SY6VYHGY5D4SITEN"  # API key 
-
-    try:
-        news_json = get_alpha_vantage_news(api_key, symbol)
-        news_articles = news_json.get('feed', [])
-        
-        # Initialize count to limit the number of articles displayed
-        count = 0 
-        for article in news_articles:
-            # Limit to displaying 5 articles
-            if count == 5:
-                break
-            # Display the article data
-            st.subheader(article['title'])
-            st.write(article['summary'])
-            st.markdown(f"[Read more]({article['url']})", unsafe_allow_html=True)
-            count += 1
-    except Exception as e:
-        st.error('Error fetching news from Alpha Vantage: ' + str(e))
+    # Placeholders keep the sections in page order while they fill in as their data arrives
+    header = st.empty()
+    header.header(symbol + " Stock Price\n")
+    chart = st.empty()
+    chart.info("Loading prices...")
+    metrics = st.container()
+    news_title = st.empty()
+    news_title.title(f'Stock News from Alpha Vantage for {symbol}')
+    news = st.container()
+
+    # Price history, company name and news are independent, so they are fetched at the same time
+    sources = {
+        # Price history comes from the market data layer shared by all pages
+        'history': (lambda: load_history(symbol, start, end).reset_index(), HISTORY_TIMEOUT),
+        'company name': (lambda: get_company_name(symbol), COMPANY_NAME_TIMEOUT),
+        # News is cached per ticker and rate limited to the Alpha Vantage quota
+        'news': (lambda: get_news_cache().get(symbol, timeout=NEWS_TIMEOUT), NEWS_TIMEOUT),
+    }
+    for source, result, error in fan_out(sources):
+        if source == 'company name':
+            # Displaying the stock information
+            company_name = result
+            if company_name is None:
+                header.error("Failed to fetch company name.")
+                continue
+            header.header(company_name + " Stock Price\n")
+            news_title.title(f'Stock News from Alpha Vantage for {company_name}')
+
+        elif source == 'history':
+            if error is not None:
+                chart.error(f"Failed to fetch price history: {error}")
+                continue
+            df = result
+            if df.empty:
+                # The price store answers a failed download with no bars instead of raising
+                chart.error(f"No price history is available for {symbol} right now.")
+                continue
+
+            # Using Plotly Express for the line chart
+            fig = px.line(df, x='Date', y='Close', labels={'Close': 'Closing Price'}, title=f"{symbol} Closing Price")
+            fig.update_xaxes(title_text='Date')
+            fig.update_yaxes(title_text='Closing Price (USD)')
+            chart.plotly_chart(fig)
+
+            # Displaying metrics
+            with metrics:
+                st.header('Data Metrics')
+                st.metric(label="Closing Price", value=f"${df['Close'].iloc[-1]:.2f}")
+                st.metric(label="Volume", value=f"{df['Volume'].iloc[-1]}")
+
+        else:
+            # Fetch and display news based on user input symbol
+            with news:
+                if error is not None:
+                    st.error('Error fetching news from Alpha Vantage: ' + str(error))
+                    continue
+                if result['stale']:
+                    st.caption("Showing saved news, new articles could not be fetched from Alpha Vantage right now.")
+                # Articles are parsed when they are fetched, only the first 5 are displayed
+                for article in result['articles'][:5]:
+                    # Display the article data
+                    st.subheader(article['title'])
+                    st.write(article['summary'])
+                    st.markdown(f"[Read more]({article['url']})", unsafe_allow_html=True)
             
             
 
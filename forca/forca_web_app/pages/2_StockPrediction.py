@@ -1,64 +1,51 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
 import plotly.graph_objects as go
 import datetime
-from tensorflow.keras.models import load_model
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 import matplotlib.pyplot as plt
 
-import requests
-from bs4 import BeautifulSoup
 
-# please uncomment for local testing
-#MODEL_PATH = '../my_lstm_model.keras'
+from backtest import BacktestStore
+from forecast_cache import ForecastCache, forecast_key
+from market_data import load_history
+from fundamentals import get_fundamentals
+from forecasting import SEQUENCE_LENGTH, prediction_intervals, rollout, simulate_paths
+from model_registry import get_registry
+from ticker_registry import get_ticker_universe
+from windowing import last_window
 
-# please uncomment for deployment
-MODEL_PATH = 'forca/my_lstm_model.keras'
-
-SEQUENCE_LENGTH = 200
-
-@st.cache_data
-def load_dataset(ticker,start_date,end_date):
+@st.cache_resource
+def load_forecast_cache():
     """
-    Download and return stock price data for a given ticker, start date, and end date.
+    Load the on-disk forecast cache shared by every session.
     
-    :param ticker: Ticker symbol of the stock.
-    :param start_date: Start date for the data retrieval.
-    :param end_date: End date for the data retrieval.
-    :return: DataFrame containing stock price data.
+    :return: ForecastCache instance.
     """
     
-    data = yf.download(ticker, start=start_date, end=end_date)
-    return pd.DataFrame(data)
+    return ForecastCache()
 
 @st.cache_resource
-def load_lstm_model():
+def load_backtest_store():
     """
-    Load and return a trained LSTM model.
+    Load the on-disk backtest store shared by every session.
     
-    :return: Trained LSTM model.
+    :return: BacktestStore instance.
     """
     
-    return load_model(MODEL_PATH)
+    return BacktestStore()
 
-def prepare_data(df):
+def prepare_last_sequence(df):
     """
-    Prepare data for LSTM model prediction. Scales the Close prices and create sequences.
+    Prepare only the last sequence needed for forecasting, without building every window.
     
     :param df: DataFrame containing the Close price of a stock.
-    :return: Tuple containing the sequences of scaled Close prices and the scaler used for inverse operation.
+    :return: Tuple containing the last sequence of scaled Close prices, which leaves out the final price, and the scaler.
     """
     scaler = MinMaxScaler()
     scaled_close = scaler.fit_transform(df['Close'].values.reshape(-1, 1))
-    X = []
-    for i in range(len(scaled_close) - SEQUENCE_LENGTH):
-        # Extract a sequence of length SEQUENCE_LENGTH
-        sequence = scaled_close[i:(i + SEQUENCE_LENGTH)]
-        # Append the extracted sequence to the list
-        X.append(sequence)
-    return np.array(X), scaler
+    return last_window(scaled_close, SEQUENCE_LENGTH, offset=1), scaler
 
 def predict_future_prices(model, last_sequence, scaler, n_future_steps):
     """
@@ -71,64 +58,32 @@ def predict_future_prices(model, last_sequence, scaler, n_future_steps):
     :return: Array of predicted future prices.
     """
     
-    future_predictions = []
-    current_sequence = last_sequence
-    for _ in range(n_future_steps):
-        
-        # Reshape the sequence for prediction and predict the next price
-        predicted = model.predict(current_sequence.reshape(1, SEQUENCE_LENGTH, 1))
-        
-        # Append the predicted price to the list
-        future_predictions.append(predicted[0][0])
-        
-        # Shift the sequence by one, dropping the oldest price and inserting the recent prediction at the end
-        current_sequence = np.roll(current_sequence, -1)
-        
-        # Update the last element with the new prediction
-        current_sequence[-1] = predicted
-        
-         # Inverse transform the predictions to the original price scale and return
-    return scaler.inverse_transform(np.array(future_predictions).reshape(-1, 1))
-
+    # The whole horizon is run by the rollout engine instead of one model.predict call per day
+    future_predictions = rollout(model, last_sequence, n_future_steps)
+    
+    # Inverse transform the predictions to the original price scale and return
+    return scaler.inverse_transform(future_predictions.reshape(-1, 1))
 
-# Create sequences for prediction
-def create_sequences(data, sequence_length):
+def predict_price_intervals(model, last_sequence, scaler, residuals, n_future_steps, n_samples=100):
     """
-    Create sequences and labels for training/testing.
+    Predict a 90% band around the future prices by bootstrapping past one-step errors into simulated paths.
     
-    :param data: Array of price data.
-    :param sequence_length: Number of data points in a sequence.
-    :return: Tuple of sequences and labels.
+    :param model: Trained LSTM model.
+    :param last_sequence: The last sequence of data points.
+    :param scaler: Scaler used to undo the scaling of data.
+    :param residuals: Past one-step errors (actual - predicted) in the original price scale.
+    :param n_future_steps: Number of future steps to predict.
+    :param n_samples: Number of simulated paths.
+    :return: Array of shape (n_future_steps, 2) with the lower and upper price of every day.
     """
     
-    X, y = [], []
-    for i in range(len(data) - sequence_length):
-        X.append(data[i:i+sequence_length])
-        y.append(data[i+sequence_length])
-    return np.array(X), np.array(y)
-
-
-# The process of scraping the sp500 data was taken from the Beautiful Soup package https://realpython.com/beautiful-soup-web-scraper-python/
-@st.cache_data
-def scrape_sp500_tickers():
-    """
-    Scrape S&P 500 ticker symbols and company names from Wikipedia.
-     
-    :return: List of tuples containing ticker symbols and company names.
-    """
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-    html = requests.get(url).text
-    soup = BeautifulSoup(html, 'html.parser')
-    table = soup.find('table', {'class': 'wikitable sortable'})
+    # All paths are rolled out as one batch, the residuals are scaled like the prices
+    paths = simulate_paths(model, last_sequence, residuals * scaler.scale_[0], n_future_steps, n_samples)
+    bands = prediction_intervals(paths)
     
-    # Initialize an empty list to store tickers
-    tickers = []
-    # Loop over each row in the table except the header row
-    for row in table.findAll('tr')[1:]:
-        ticker = row.findAll('td')[0].text.strip()
-        company_name = row.findAll('td')[1].text.strip()
-        tickers.append((ticker, company_name))
-    return tickers
+    # Undo the min-max scaling for both columns at once
+    return (bands - scaler.min_[0]) / scaler.scale_[0]
+
 
 def show_stock_prediction():
     """
@@ -148,18 +103,18 @@ def show_stock_prediction():
         end_date = datetime.datetime.now().strftime("%Y-%m-%d")
         
         
-        # Scrape S&P 500 tickers
-        sp500_tickers = scrape_sp500_tickers()
-    
-        # options for the selectbox
-        options = [f"{ticker} - {company}" for ticker, company in sp500_tickers]
-        # Sort options alphabetically by company name
-        options.sort()
+        # S&P 500 options, sorted once by the shared ticker registry
+        options = get_ticker_universe().options
+        if not options:
+            # The first scrape failed and there is no saved list yet, it is retried on a later rerun
+            st.error("The list of S&P 500 companies could not be loaded. Please try again in a minute.")
+            st.stop()
         selected_option = st.selectbox("Select a company:", options)
         ticker_symbol = selected_option.split(" - ")[0]
 
         if ticker_symbol:
-            df = load_dataset(ticker_symbol,start_date,end_date)
+            # Price history comes from the market data layer shared by all pages
+            df = load_history(ticker_symbol, start_date, end_date)
             if not df.empty:
                 
                 # display candlestick chart for the stock data
@@ -173,17 +128,41 @@ def show_stock_prediction():
                     st.error("Stock prediction is not available after 01 March 2022.")
                     return
 
-                lstm_model = load_lstm_model()
-                X, scaler = prepare_data(df)
+                # The active model version is warmed up in the background by the registry. Rollouts
+                # predict one step at a time and run on the model itself, which keeps the compiled
+                # Keras rollout, one-shot backtest predictions go through the shared batching worker
+                active_model = get_registry().get()
+                lstm_model = active_model.model
+                forecast_cache = load_forecast_cache()
             
                 n_future_steps = st.number_input("Number of days to predict:", min_value=1, value=10, max_value=100)
-                last_sequence = X[-1]
-                predicted_prices = predict_future_prices(lstm_model, last_sequence, scaler, n_future_steps)
                 
+                def forecast(horizon):
+                    last_sequence, scaler = prepare_last_sequence(df)
+                    return predict_future_prices(lstm_model, last_sequence, scaler, horizon)
+                
+                # Forecasts are only computed when neither the prices nor the model changed since the last visit
+                predicted_prices = forecast_cache.get_or_compute(forecast_key(ticker_symbol, df, active_model.hash), n_future_steps, forecast)
+                
+                # The following code is taken from the research component
+                # The backtest over the test split is stored per ticker, only bars added since the last visit are predicted
+                backtest = load_backtest_store().update(ticker_symbol, df, active_model.batcher, active_model.hash)
                 
                 # future dates for the predicted prices
                 future_dates = pd.date_range(start=df.index.max() + pd.Timedelta(days=1), periods=n_future_steps)
                 
+                # Confidence band from simulated paths, using the backtest errors as the noise distribution
+                if backtest.metrics['n'] and st.checkbox("Show 90% prediction interval"):
+                    residuals = (backtest.actual - backtest.predicted).ravel()
+                    
+                    def interval(horizon):
+                        last_sequence, scaler = prepare_last_sequence(df)
+                        return predict_price_intervals(lstm_model, last_sequence, scaler, residuals, horizon)
+                    
+                    bands = forecast_cache.get_or_compute(forecast_key(ticker_symbol, df, active_model.hash, kind='interval'), n_future_steps, interval)
+                    fig.add_trace(go.Scatter(x=future_dates, y=bands[:, 1], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+                    fig.add_trace(go.Scatter(x=future_dates, y=bands[:, 0], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(250, 0, 0, 0.15)', name='90% Prediction Interval'))
+                
                 # Add predicted prices to the existing candlestick chart
                 fig.add_trace(go.Scatter(x=future_dates, y=predicted_prices.flatten(), mode='lines', name='Predicted Prices', line=dict(color='red', dash='dot')))
                 fig.update_layout(title=f"{ticker_symbol} Stock Price Prediction", xaxis_rangeslider_visible=False)
@@ -193,30 +172,9 @@ def show_stock_prediction():
                 # HTML markdown from streamlit documentation https://docs.streamlit.io/develop/api-reference/text/st.markdown
                 st.markdown(f"<h4 style='color:green;'>Predicted Future Price after {n_future_steps} days: ${predicted_prices[-1][0]:.2f}</h4>", unsafe_allow_html=True)
                 
-                # The following code is taken from the research component
-                # Prepare the data for LSTM
-                scaler = MinMaxScaler()
-                scaled_data = scaler.fit_transform(df['Close'].values.reshape(-1, 1))
-                X, y = create_sequences(scaled_data, SEQUENCE_LENGTH)
-
-                # Split data into train and test sets
-                split_index = int(len(X) * 0.8)
-                X_train, X_test = X[:split_index], X[split_index:]
-                y_train, y_test = y[:split_index], y[split_index:]
-                
-                # Define the starting index for test data based on SEQUENCE_LENGTH and split_index
-                test_start_idx = split_index + SEQUENCE_LENGTH
-                
-                # Create a date index for the test set
-                dates_for_test = df.index[test_start_idx:test_start_idx + len(X_test)]
-
-                # Load LSTM model and make predictions
-                lstm_model = load_lstm_model()
-                predictions = lstm_model.predict(X_test)
-
-                # Inverse transform to get actual prices
-                y_test_actual = scaler.inverse_transform(y_test.reshape(-1, 1))
-                predictions_actual = scaler.inverse_transform(predictions)
+                dates_for_test = backtest.dates
+                y_test_actual = backtest.actual
+                predictions_actual = backtest.predicted
 
                 # Plot the actual and predicted prices using Matplotlib
                 fig, ax = plt.subplots(figsize=(12, 6))
@@ -228,53 +186,66 @@ def show_stock_prediction():
                 ax.legend()
                 st.pyplot(fig)
                 
+                # Accuracy of the backtest, kept up to date incrementally
+                metrics = backtest.metrics
+                if metrics['n']:
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("RMSE", f"${metrics['rmse']:.2f}")
+                    col2.metric("MAE", f"${metrics['mae']:.2f}")
+                    col3.metric("MAPE", f"{metrics['mape']:.2f}%")
+                
+                with st.expander("Model accuracy across tickers"):
+                    st.dataframe(pd.DataFrame.from_dict(load_backtest_store().all_metrics(), orient='index'))
+                
                 
                 
                # financial data was taken from the yfinance documentation https://pypi.org/project/yfinance/ 
+            # The info dictionary is fetched once per ticker and day, every field below is read from it
+            info = get_fundamentals().get(ticker_symbol)
             try:
-                company_name = yf.Ticker(ticker_symbol).info['longName']
+                company_name = info['longName']
                 st.write(f"**Company Name:** {company_name}")
             except KeyError:
                 st.write("Company name information not available.")
 
             try:
-                industry = yf.Ticker(ticker_symbol).info['industry']
+                industry = info['industry']
                 st.write(f"**Industry:** {industry}")
             except KeyError:
                 st.write("Industry information not available.")
 
             try:
-                market_cap = yf.Ticker(ticker_symbol).info['marketCap']
+                market_cap = info['marketCap']
                 st.write(f"**Market Cap:** ${market_cap:,}")
             except KeyError:
                 st.write("Market Cap information not available.")
 
             try:
-                dividend_rate = yf.Ticker(ticker_symbol).info.get('dividendRate', 'N/A')
+                dividend_rate = info.get('dividendRate', 'N/A')
                 st.write(f"**Dividend Rate:** ${dividend_rate}")
             except KeyError:
                 st.write("Dividend Rate information not available.")
 
             try:
-                trailing_eps = yf.Ticker(ticker_symbol).info['trailingEps']
+                trailing_eps = info['trailingEps']
                 st.write(f"**EPS (TTM):** ${trailing_eps}")
             except KeyError:
                 st.write("EPS (TTM) information not available.")
 
             try:
-                forward_pe = yf.Ticker(ticker_symbol).info['forwardPE']
+                forward_pe = info['forwardPE']
                 st.write(f"**P/E Ratio (TTM):** {forward_pe}")
             except KeyError:
                 st.write("P/E Ratio (TTM) information not available.")
 
             try:
-                fifty_two_week_high = yf.Ticker(ticker_symbol).info['fiftyTwoWeekHigh']
+                fifty_two_week_high = info['fiftyTwoWeekHigh']
                 st.write(f"**52 Week High:** ${fifty_two_week_high}")
             except KeyError:
                 st.write("52 Week High information not available.")
 
             try:
-                fifty_two_week_low = yf.Ticker(ticker_symbol).info['fiftyTwoWeekLow']
+                fifty_two_week_low = info['fiftyTwoWeekLow']
                 st.write(f"**52 Week Low:** ${fifty_two_week_low}")
             except KeyError:
                 st.write("52 Week Low information not available.")
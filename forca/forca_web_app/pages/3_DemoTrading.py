@@ -1,210 +1,93 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
+import numpy as np
 import plotly.graph_objects as go
 import datetime
-from database import connect_to_database
+import math
+from database import db_transaction
+from market_data import load_history
+from orders import close_position, open_position
+from quotes import QUOTE_TTL, get_quote_cache
+from ticker_registry import get_ticker_universe
 import time
 
-import requests
-from bs4 import BeautifulSoup
 
 
-# Margin percentage for both buy and sell positions
-MARGIN_PERCENTAGE = 10  
-
-# The process of scraping the sp500 data was taken from the Beautiful Soup package https://realpython.com/beautiful-soup-web-scraper-python/
-@st.cache_data
-def scrape_sp500_tickers():
-    """
-    Scrape S&P 500 ticker symbols and company names from Wikipedia.
-     
-    :return: List of tuples containing ticker symbols and company names.
+def get_current_price(ticker, max_age=None):
     """
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-    html = requests.get(url).text
-    soup = BeautifulSoup(html, 'html.parser')
-    table = soup.find('table', {'class': 'wikitable sortable'})
-    
-    # Initialize an empty list to store tickers
-    tickers = []
-    # Loop over each row in the table except the header row
-    for row in table.findAll('tr')[1:]:
-        ticker = row.findAll('td')[0].text.strip()
-        company_name = row.findAll('td')[1].text.strip()
-        tickers.append((ticker, company_name))
-    return tickers
-
-@st.cache_data
-def load_dataset(ticker, start_date='2022-01-01', end_date=datetime.datetime.now().strftime("%Y-%m-%d")):
-    """
-    Download and return stock price data for a given ticker, start date, and end date.
-    
-    :param ticker: Ticker symbol of the stock.
-    :param start_date: Start date for the data retrieval.
-    :param end_date: End date for the data retrieval.
-    :return: DataFrame containing stock price data.
-    """
-    data = yf.download(ticker, start=start_date, end=end_date)
-    return pd.DataFrame(data)
-
-@st.cache_data
-def get_current_price(ticker):
-    """
-    Retrieve the current closing price of a stock.
+    Retrieve the current closing price of a stock from the shared quote cache.
     
     :param ticker: Stock ticker symbol.
+    :param max_age: Seconds, an older cached price is fetched again first. None returns the cached price right away.
     :return: Latest closing price of the stock.
+    :raises ValueError: If no price could be fetched for the ticker.
     """
-    data = yf.Ticker(ticker).history(period='1m')
-    return data['Close'].iloc[-1]
+    price = float(get_quote_cache().get([ticker], max_age=max_age).at[ticker, 'price'])
+    # The quote cache reports a symbol it could not fetch as NaN
+    if not math.isfinite(price):
+        raise ValueError(f"No current price available for {ticker}.")
+    return price
+
 
-def update_transaction(user_id, ticker, lot_size, transaction_type, current_price):
+def show_quote_age(quotes):
     """
-    Update the transaction records in the database for a given user and stock.
+    Show how old the prices used on the page are, with a warning when some of them are stale.
     
-    :param user_id: User ID.
-    :param ticker: Stock ticker symbol.
-    :param lot_size: Number of shares to buy/sell for a transaction.
-    :param transaction_type: Type of transaction (BUY or SELL).
-    :param current_price: Current price of the stock.
-    :return: Tuple showing success/failure and a message describing the outcome.
+    :param quotes: DataFrame returned by QuoteCache.get.
     """
-    conn = connect_to_database()
-    if conn is not None:
-        try:
-            with conn.cursor() as cur:
-                # demo account ID associated with the user
-                cur.execute("SELECT demo_id FROM demo_accounts WHERE user_id = %s;", (user_id,))
-                demo_id = cur.fetchone()[0]
-
-                # Insert the new transaction into the transactions table
-                cur.execute("""
-                    INSERT INTO transactions (transaction_type, stock_symbol, quantity, price, demo_id)
-                    VALUES (%s, %s, %s, %s, %s);
-                """, (transaction_type, ticker, lot_size, current_price, demo_id))
-
-                conn.commit()
-                return True, f"Transaction successful: {transaction_type} {lot_size} shares of {ticker} at ${current_price:.2f} each."
-        except Exception as e:
-            return False, f"Database operation failed: {str(e)}"
-        finally:
-            conn.close()
+    if quotes.empty or quotes['age'].isna().all():
+        return
+    oldest = quotes['age'].max()
+    if quotes['stale'].any():
+        st.warning(f"Some prices are {oldest:.0f}s old and are being refreshed.")
     else:
-        return False, "Failed to connect to the database."
+        st.caption(f"Prices updated {oldest:.0f}s ago.")
 
-def buy_stock(ticker, lot_size):
+def place_order(ticker, lot_size, transaction_type):
     """
-    Execute a BUY transaction for a given ticker and lot size.
+    Execute a BUY or SELL transaction for a given ticker and lot size.
+    
     :param ticker: Stock ticker symbol.
-    :param lot_size: Number of shares to purchase.
+    :param lot_size: Number of shares to buy/sell.
+    :param transaction_type: Type of transaction (BUY or SELL).
     """
-    
-    
-    current_price = get_current_price(ticker)
-    user_id = st.session_state.user_id
-    total_purchase_price = current_price * lot_size
-    margin_required = total_purchase_price * MARGIN_PERCENTAGE / 100
-
-    # Check if the user has enough balance to cover the margin
-    has_account, demo_id, balance = check_or_create_demo_account(user_id)
-    if not has_account:
-        st.error("Demo account does not exist or could not be created.")
-        return
-
-    if balance < margin_required:
-
-        placeholder = st.empty()
-        # Show a message
-        placeholder.error(f"Insufficient balance to cover the margin required for this purchase. Margin required: ${margin_required}")
-        # Wait for 2 seconds
-        time.sleep(2)
-        # Clear the message
-        placeholder.empty()
-        return
-
-    # Proceed with the transaction since the balance is sufficient to cover the margin
-    success, message = update_transaction(user_id, ticker, lot_size, "BUY", current_price)
+    # Orders execute at a price no older than the quote TTL
+    try:
+        current_price = get_current_price(ticker, max_age=QUOTE_TTL)
+    except Exception as e:
+        success, message = False, f"Failed to fetch current price: {e}"
+    else:
+        # The margin check, the new transaction and the balance update happen in one locked statement
+        success, message = open_position(st.session_state.user_id, transaction_type, ticker, lot_size, current_price)
+    placeholder = st.empty()
     if success:
-        # Deduct the margin required for the buy position from the account balance
-        update_account_balance(user_id, -margin_required)
-        
-        placeholder = st.empty()
         # Show a message
         placeholder.success(message)
         # Wait for 3 seconds
         time.sleep(3)
-        # Clear the message
-        placeholder.empty()
     else:
-        st.error(message)
+        placeholder.error(message)
+        # Wait for 2 seconds
+        time.sleep(2)
+    # Clear the message
+    placeholder.empty()
 
-def sell_stock(ticker, lot_size):
+def buy_stock(ticker, lot_size):
     """
-    Execute a SELL transaction for a given ticker and lot size.
-    
+    Execute a BUY transaction for a given ticker and lot size.
     :param ticker: Stock ticker symbol.
     :param lot_size: Number of shares to purchase.
     """
-    
-    current_price = get_current_price(ticker)
-    user_id = st.session_state.user_id
-    total_purchase_price = current_price * lot_size
-    margin_required = total_purchase_price * MARGIN_PERCENTAGE / 100
-
-    # Check if the user has enough balance to cover the margin
-    has_account, demo_id, balance = check_or_create_demo_account(user_id)
-    if not has_account:
-        st.error("Demo account does not exist or could not be created.")
-        return
-
-    if balance < margin_required:
-        placeholder = st.empty()
-        # Show a message
-        placeholder.error(f"Insufficient balance to cover the margin required for this purchase. Margin required: ${margin_required}")
-        # Wait for 2 seconds
-        time.sleep(2)
-        # Clear the message
-        placeholder.empty()
-        return
+    place_order(ticker, lot_size, "BUY")
 
-    success, message = update_transaction(user_id, ticker, lot_size, "SELL", current_price)
-    if success:
-        # margin required for the sell position to the account balance
-        update_account_balance(user_id, -margin_required)
-        
-        placeholder = st.empty()
-        # Show a message
-        placeholder.success(message)
-        # Wait for 3 seconds
-        time.sleep(3)
-        # Clear the message
-        placeholder.empty()
-    else:
-        st.error(message)
-        
-def update_account_balance(user_id, amount):
+def sell_stock(ticker, lot_size):
     """
-    Update the balance of a user's demo account.
+    Execute a SELL transaction for a given ticker and lot size.
     
-    :param user_id: User ID.
-    :param amount: Amount to update in the user's account balance.
+    :param ticker: Stock ticker symbol.
+    :param lot_size: Number of shares to purchase.
     """
-    conn = connect_to_database()
-    if conn is not None:
-        try:
-            # Updates the amount allocated to the demo account
-            with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE demo_accounts
-                    SET allocated_amount = allocated_amount + %s
-                    WHERE user_id = %s;
-                """, (amount, user_id))
-                conn.commit()
-        except Exception as e:
-            print(f"Failed to update account balance: {str(e)}")
-        finally:
-            conn.close()
+    place_order(ticker, lot_size, "SELL")
 
 def calculate_moving_averages(data, windows=[20, 50]):
     """
@@ -246,13 +129,12 @@ def trade_stocks():
     
     st.subheader("Trade Stocks")
     
-    # Scrape S&P 500 tickers
-    sp500_tickers = scrape_sp500_tickers()
-    
-    # options for the selectbox
-    options = [f"{ticker} - {company}" for ticker, company in sp500_tickers]
-    # Sort options alphabetically by company name
-    options.sort()
+    # S&P 500 options, sorted once by the shared ticker registry
+    options = get_ticker_universe().options
+    if not options:
+        # The first scrape failed and there is no saved list yet, it is retried on a later rerun
+        st.error("The list of S&P 500 companies could not be loaded. Please try again in a minute.")
+        st.stop()
     selected_option = st.selectbox("Select a company:", options)
     ticker = selected_option.split(" - ")[0]
     
@@ -279,7 +161,8 @@ def trade_stocks():
                 
         # User input for start date of the stock data to fetch and display
         start_date = st.date_input("Start Date", value=datetime.date.today() - datetime.timedelta(days=365))
-        data = load_dataset(ticker, start_date=start_date)
+        # Price history comes from the market data layer shared by all pages
+        data = load_history(ticker, start_date, datetime.date.today())
         if not data.empty:
             analysis_options = st.multiselect('Select Analysis Options', ['Moving Averages', 'Bollinger Bands'])
             fig = go.Figure(data=[go.Candlestick(x=data.index, open=data['Open'], high=data['High'], low=data['Low'], close=data['Close'])])
@@ -306,211 +189,143 @@ def display_open_trades(user_id):
     
     :param user_id: User ID.
     """
-    conn = connect_to_database()
-    if conn is not None:
-        try:
+    try:
+        # fetches all of the transactions allocated to the users created demo account
+        with db_transaction() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT transaction_id, transaction_type, stock_symbol, quantity, price, timestamp
+                FROM transactions
+                WHERE demo_id = (
+                    SELECT demo_id FROM demo_accounts WHERE user_id = %s
+                ) AND status = 'OPEN';
+            """, (user_id,))
+
+            trades = cur.fetchall()
+
+        if trades:
+            # Initalizes the Dataframe to store open trades
+            df = pd.DataFrame(trades, columns=['Transaction ID', 'Type', 'Symbol', 'Quantity', 'Price', 'Timestamp'])
+
+            # Price every open trade from the shared quote cache instead of one request per row
+            quotes = get_quote_cache().get(df['Symbol'])
+            current_prices = df['Symbol'].map(quotes['price'])
+            prices = df['Price'].astype(float)
+            quantities = df['Quantity'].astype(float)
+            direction = np.where(df['Type'] == 'BUY', 1.0, -1.0)
+            df['Gain/Loss $'] = direction * (current_prices - prices) * quantities
+            df['Gain/Loss %'] = df['Gain/Loss $'] / (prices * quantities) * 100
+
+            st.subheader("Open Trades")
+            show_quote_age(quotes)
             
-            # fetches all of the transactions allocated to the users created demo account
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT transaction_id, transaction_type, stock_symbol, quantity, price, timestamp
-                    FROM transactions
-                    WHERE demo_id = (
-                        SELECT demo_id FROM demo_accounts WHERE user_id = %s
-                    ) AND status = 'OPEN';
-                """, (user_id,))
-
-                trades = cur.fetchall()
-
-                if trades:
-                    
-                    # Initalizes the Dataframe to store open trades
-                    df = pd.DataFrame(trades, columns=['Transaction ID', 'Type', 'Symbol', 'Quantity', 'Price', 'Timestamp'])
-                    st.subheader("Open Trades")
+            # defines the columns of the open trades frame
+            cols = st.columns([3, 3, 3, 3, 3, 3, 3, 3, 3])
+            headers = ['Transaction ID', 'Type', 'Symbol', 'Quantity', 'Price', 'Timestamp', 'Gain/Loss %', 'Gain/Loss $', 'Action']
+            for col, header in zip(cols, headers):
+                col.write(header)
+                
+                
+            for index, row in df.iterrows():
+                cols = st.columns([3, 3, 3, 3, 3, 3, 3, 3, 3])
+                cols[0].write(row['Transaction ID'])
+                cols[1].write(row['Type'])
+                cols[2].write(row['Symbol'])
+                cols[3].write(row['Quantity'])
+                cols[4].write(f"${row['Price']:.2f}")
+                cols[5].write(row['Timestamp'].strftime('%Y-%m-%d %H:%M:%S'))
+
+                dollar_gain_loss = row['Gain/Loss $']
+                gain_loss_percentage = row['Gain/Loss %']
+                
+                if gain_loss_percentage >= 0:
+                    color = 'green'
                     
-                    # defines the columns of the open trades frame
-                    cols = st.columns([3, 3, 3, 3, 3, 3, 3, 3, 3])
-                    headers = ['Transaction ID', 'Type', 'Symbol', 'Quantity', 'Price', 'Timestamp', 'Gain/Loss %', 'Gain/Loss $', 'Action']
-                    for col, header in zip(cols, headers):
-                        col.write(header)
-                        
-                        
-                    for index, row in df.iterrows():
-                        cols = st.columns([3, 3, 3, 3, 3, 3, 3, 3, 3])
-                        cols[0].write(row['Transaction ID'])
-                        cols[1].write(row['Type'])
-                        cols[2].write(row['Symbol'])
-                        cols[3].write(row['Quantity'])
-                        cols[4].write(f"${row['Price']:.2f}")
-                        cols[5].write(row['Timestamp'].strftime('%Y-%m-%d %H:%M:%S'))
-
-                        current_price = get_current_price(row['Symbol'])
-                        price = float(row['Price'])
-                        quantity = row['Quantity']
-                        
-                        # calculate gain/loss value 
-                        if row['Type'] == 'BUY':
-                            dollar_gain_loss = (current_price - price) * quantity  
-                        else:
-                            dollar_gain_loss = (price - current_price) * quantity
-                        
-                        gain_loss_percentage = (dollar_gain_loss / (price * quantity)) * 100
-                        
-                        if gain_loss_percentage >= 0:
-                            color = 'green'
-                            
-                        else:
-                            color = 'red'
-                        
-                        # HTML Markdown to display gain in green or loss in red
-                        cols[6].markdown(f"<span style='color:{color};'>{gain_loss_percentage:+.2f}%</span>", unsafe_allow_html=True)
-                        cols[7].markdown(f"<span style='color:{color};'>${dollar_gain_loss:+.2f}</span>", unsafe_allow_html=True)
-
-                        if cols[8].button("Close Position", key=row['Transaction ID']):
-                            close_trade(user_id, row['Transaction ID'])
-                            st.rerun()
-
                 else:
-                    st.write("No open trades found.")
+                    color = 'red'
+                
+                # HTML Markdown to display gain in green or loss in red
+                cols[6].markdown(f"<span style='color:{color};'>{gain_loss_percentage:+.2f}%</span>", unsafe_allow_html=True)
+                cols[7].markdown(f"<span style='color:{color};'>${dollar_gain_loss:+.2f}</span>", unsafe_allow_html=True)
 
-        except Exception as e:
-            st.error(f"Failed to fetch open trades: {e}")
-        finally:
-            conn.close()
-    else:
-        st.error("Failed to connect to the database.")
+                if cols[8].button("Close Position", key=row['Transaction ID']):
+                    close_trade(user_id, row['Transaction ID'], row['Symbol'])
+                    st.rerun()
+
+        else:
+            st.write("No open trades found.")
+
+    except Exception as e:
+        st.error(f"Failed to fetch open trades: {e}")
 
         
 
     
         
-def close_trade(user_id, transaction_id):
+def close_trade(user_id, transaction_id, stock_symbol):
     """
     Close an open trade for a user by reversing the transaction type and updating the account balance.
     
     :param user_id: User ID.
     :param transaction_id: ID of the transaction to close.
+    :param stock_symbol: Stock ticker symbol of the trade.
     """
-    conn = connect_to_database()
-    if conn is not None:
-        try:
-            with conn.cursor() as cur:
-                # Fetch the original transaction details
-                cur.execute("""
-                    SELECT stock_symbol, quantity, price, transaction_type
-                    FROM transactions
-                    WHERE transaction_id = %s;
-                """, (transaction_id,))
-                transaction = cur.fetchone()
-
-                if transaction:
-                    stock_symbol, quantity, price, transaction_type = transaction
-                    current_price = get_current_price(stock_symbol)
-
-                    # Ensure all numbers are floats for calculation
-                    transaction_price = float(price)
-                    quantity = float(quantity)
-                    current_price = float(current_price)
-
-                    margin_used = transaction_price * quantity * MARGIN_PERCENTAGE / 100
-
-                    # Determine profit or loss
-                    if transaction_type == 'BUY':
-                        profit_loss = (current_price - transaction_price) * quantity
-                        net_balance_change = profit_loss + margin_used  # Return margin and add profit or deduct loss
-                    else:  # SELL
-                        profit_loss = (transaction_price - current_price) * quantity
-                        net_balance_change = profit_loss + margin_used  # Return margin and add profit or deduct loss
-
-                    # Reverse the transaction type for closing the trade
-                    reverse_type = 'BUY' if transaction_type == 'SELL' else 'SELL'
-
-                    # Insert the closing transaction
-                    cur.execute("""
-                        INSERT INTO transactions (transaction_type, stock_symbol, quantity, price, demo_id, status)
-                        VALUES (%s, %s, %s, %s, (
-                            SELECT demo_id FROM demo_accounts WHERE user_id = %s
-                        ), 'CLOSED');
-                    """, (reverse_type, stock_symbol, quantity, current_price, user_id))
-
-                    # Update the original transaction to mark it as closed
-                    cur.execute("""
-                        UPDATE transactions
-                        SET status = 'CLOSED'
-                        WHERE transaction_id = %s;
-                    """, (transaction_id,))
-                    
-                    # Update the account balance
-                    update_account_balance(user_id, net_balance_change)
-
-                    conn.commit()
-                    
-                    placeholder = st.empty()
+    # The position closes at a price no older than the quote TTL
+    try:
+        current_price = get_current_price(stock_symbol, max_age=QUOTE_TTL)
+    except Exception as e:
+        st.error(f"Failed to fetch current price: {e}")
+        return
 
-                    # Show a message
-                    placeholder.success(f"Trade closed successfully. Transaction type: {reverse_type}, Quantity: {quantity}, Price: ${current_price:.2f}, Profit/Loss: ${profit_loss:.2f}")
+    # The closing transaction, the status change and the balance update happen in one locked statement
+    success, message = close_position(user_id, transaction_id, stock_symbol, current_price)
+    if success:
+        placeholder = st.empty()
 
-                    # Wait for 5 seconds
-                    time.sleep(5)
+        # Show a message
+        placeholder.success(message)
 
-                    # Clear the message
-                    placeholder.empty()
+        # Wait for 5 seconds
+        time.sleep(5)
 
-                else:
-                    st.error("Original transaction not found.")
-        except Exception as e:
-            st.error(f"Failed to close trade: {e}")
-        finally:
-            conn.close()
+        # Clear the message
+        placeholder.empty()
     else:
-        st.error("Failed to connect to the database.")
+        st.error(message)
         
         
 def calculate_current_holdings(user_id):
     """
-    Calculate the total current holdings value for a user account based on open transactions.
+    Calculate the total current holdings value for a user account based on its positions.
     
     :param user_id: User's ID.
     """
-    conn = connect_to_database()
-    if conn:
-        try:
-            # Initialize total holdings value
-            total_holdings_value = 0.0  
-            with conn.cursor() as cur:
-                # Fetch all open transactions for the user
-                cur.execute("""
-                SELECT stock_symbol, transaction_type, quantity, price
-                FROM transactions
-                WHERE demo_id = (SELECT demo_id FROM demo_accounts WHERE user_id = %s) AND status = 'OPEN';
-                """, (user_id,))
-                
-                
-                for row in cur.fetchall():
-                    symbol, transaction_type, quantity, transaction_price = row
-                    current_price = get_current_price(symbol)
-                    
-                    
-                    transaction_price = float(transaction_price)
-                    
-                    if transaction_type == 'BUY':
-                        # Calculate the change in value since the transaction
-                        value_change = (current_price - transaction_price) * quantity
-                    else:  # transaction_type == 'SELL'
-                        # Calculate the change in value since the transaction, reverse for sell
-                        value_change = (transaction_price - current_price) * quantity
-
-                    total_holdings_value += value_change
+    try:
+        with db_transaction() as conn, conn.cursor() as cur:
+            # One row per symbol, kept up to date by every order and close
+            cur.execute("""
+            SELECT stock_symbol, net_quantity, average_price, cost_basis, margin
+            FROM positions
+            WHERE demo_id = (SELECT demo_id FROM demo_accounts WHERE user_id = %s) AND open_trades > 0
+            ORDER BY stock_symbol;
+            """, (user_id,))
             
-            # Display the total current holdings value, can be negative or positive
-            st.write(f"Total Current Holdings Value: ${total_holdings_value:.2f}")
-            
-        except Exception as e:
-            st.error(f"Failed to calculate current holdings: {e}")
-        finally:
-            conn.close()
-    else:
-        st.error("Failed to connect to the database.")
+            positions = pd.DataFrame(cur.fetchall(), columns=['Symbol', 'Net Quantity', 'Average Price', 'Cost Basis', 'Margin'])
+
+        # Price the whole portfolio from the shared quote cache
+        quotes = get_quote_cache().get(positions['Symbol'])
+        current_prices = positions['Symbol'].map(quotes['price'])
+        # Sells count with negative quantity, so this is the change in value since every open transaction
+        positions['Gain/Loss $'] = current_prices * positions['Net Quantity'].astype(float) - positions['Cost Basis'].astype(float)
+        total_holdings_value = float(positions['Gain/Loss $'].sum())
+        
+        # Display the total current holdings value, can be negative or positive
+        st.write(f"Total Current Holdings Value: ${total_holdings_value:.2f}")
+        show_quote_age(quotes)
+        if not positions.empty:
+            st.dataframe(positions.drop(columns='Cost Basis'), hide_index=True)
+        
+    except Exception as e:
+        st.error(f"Failed to calculate current holdings: {e}")
 
 
 
@@ -522,26 +337,19 @@ def check_or_create_demo_account(user_id):
     :param user_id: User's ID.
     :return: Tuple indicating if an account exists, the account ID, and the balance.
     """
-    conn = connect_to_database()
-    if conn is not None:
-        try:
-            with conn.cursor() as cur:
-                # Check if the user already has a demo account
-                cur.execute("SELECT demo_id, allocated_amount FROM demo_accounts WHERE user_id = %s;", (user_id,))
-                account_info = cur.fetchone()
+    try:
+        with db_transaction() as conn, conn.cursor() as cur:
+            # Check if the user already has a demo account
+            cur.execute("SELECT demo_id, allocated_amount FROM demo_accounts WHERE user_id = %s;", (user_id,))
+            account_info = cur.fetchone()
 
-                if account_info:
-                    return True, account_info[0], account_info[1]  # Has account, return demo_id and balance
-                else:
-                    # No account found, create a new one with a default amount (handled below)
-                    return False, None, 0
-        except Exception as e:
-            print(f"Error checking or creating demo account: {e}")
+        if account_info:
+            return True, account_info[0], account_info[1]  # Has account, return demo_id and balance
+        else:
+            # No account found, create a new one with a default amount (handled below)
             return False, None, 0
-        finally:
-            conn.close()
-    else:
-        print("Failed to connect to the database.")
+    except Exception as e:
+        print(f"Error checking or creating demo account: {e}")
         return False, None, 0
     
 
@@ -556,23 +364,15 @@ def allocate_initial_amount(user_id):
     
     initial_amount = st.number_input("Enter initial amount for the demo account:", min_value=100.0, step=100.0, format="%.2f")
     if st.button("Allocate"):
-        conn = connect_to_database()
-        if conn is not None:
-            try:
-                with conn.cursor() as cur:
-                    # Insert new demo account with allocated amount
-                    cur.execute("INSERT INTO demo_accounts (allocated_amount, user_id) VALUES (%s, %s) RETURNING demo_id;", (initial_amount, user_id))
-                    demo_id = cur.fetchone()[0]
-                    conn.commit()
-                    st.success(f"Allocated ${initial_amount} to your demo account with ID {demo_id}.")
-                    return demo_id
-            except Exception as e:
-                st.error(f"Failed to allocate initial amount. Error: {e}")
-                return None
-            finally:
-                conn.close()
-        else:
-            st.error("Failed to connect to the database for allocation.")
+        try:
+            with db_transaction() as conn, conn.cursor() as cur:
+                # Insert new demo account with allocated amount
+                cur.execute("INSERT INTO demo_accounts (allocated_amount, user_id) VALUES (%s, %s) RETURNING demo_id;", (initial_amount, user_id))
+                demo_id = cur.fetchone()[0]
+            st.success(f"Allocated ${initial_amount} to your demo account with ID {demo_id}.")
+            return demo_id
+        except Exception as e:
+            st.error(f"Failed to allocate initial amount. Error: {e}")
             return None
 
 def show_demo_trading():
@@ -1,7 +1,7 @@
 import pandas as pd
 import datetime
 import calendar
-from database import connect_to_database
+from database import db_transaction
 import streamlit as st
 
 def fetch_trade_days(user_id, year, month):
@@ -13,27 +13,24 @@ def fetch_trade_days(user_id, year, month):
     :param month: Month for which trade days are to be fetched.
     :return: List of days in the month when trades occurred.
     """
-    conn = connect_to_database()
     trade_days = []
-    if conn is not None:
-        try:
-            with conn.cursor() as cur:
-                # Adjusted the query to join with the demo_accounts table
-                sql_query = """
-                SELECT DISTINCT DATE(t.timestamp)
-                FROM transactions t
-                JOIN demo_accounts d ON t.demo_id = d.demo_id
-                WHERE EXTRACT(MONTH FROM t.timestamp) = %s
-                  AND EXTRACT(YEAR FROM t.timestamp) = %s
-                  AND d.user_id = %s;
-                """
-                cur.execute(sql_query, (month, year, user_id))
-                result = cur.fetchall()
-                trade_days = [day[0].day for day in result]  
-        except Exception as e:
-            st.error(f"Database query failed: {e}")
-        finally:
-            conn.close()
+    month_start = datetime.date(year, month, 1)
+    next_month_start = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    try:
+        with db_transaction() as conn, conn.cursor() as cur:
+            # A timestamp range instead of EXTRACT lets the (demo_id, timestamp) index find the month
+            sql_query = """
+            SELECT DISTINCT DATE(t.timestamp)
+            FROM transactions t
+            WHERE t.demo_id = (SELECT demo_id FROM demo_accounts WHERE user_id = %s)
+              AND t.timestamp >= %s
+              AND t.timestamp < %s;
+            """
+            cur.execute(sql_query, (user_id, month_start, next_month_start))
+            result = cur.fetchall()
+            trade_days = [day[0].day for day in result]  
+    except Exception as e:
+        st.error(f"Database query failed: {e}")
     return trade_days
 
 
@@ -1,6 +1,6 @@
 import streamlit as st
-from database import connect_to_database
-import pandas as pd
+from database import db_transaction
+from transaction_history import EXPORT_FORMATS, export_history, history_page
 
 def logout_user():
     """
@@ -25,33 +25,41 @@ def display_profile_info():
 
 def view_all_transactions(user_id):
     """
-    Fetch and display all transactions associated with a user's demo account from the database.
+    Display the transactions of a user's demo account one page at a time, newest first, and offer
+    the whole history as a download.
 
     :param user_id: The unique identifier of the user.
     """
-    # Fetch and display all transactions from the database
-    conn = connect_to_database()
-    if conn:
-        try:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT * FROM transactions
-                    WHERE demo_id = (
-                        SELECT demo_id FROM demo_accounts WHERE user_id = %s
-                    );
-                """, (user_id,))
-                transactions = cur.fetchall()
-                if transactions:
-                    df = pd.DataFrame(transactions, columns=['Transaction ID', 'Type', 'Symbol', 'Quantity', 'Price', 'Timestamp', 'DemoID', 'Status'])
-                    st.write(df)
-                else:
-                    st.write("No transactions found.")
-        except Exception as e:
-            st.error("Failed to fetch transactions: " + str(e))
-        finally:
-            conn.close()
-    else:
-        st.error("Failed to connect to the database.")
+    # Cursor of every page visited so far, the last one is the page shown
+    cursors = st.session_state.setdefault('history_cursors', [None])
+    try:
+        df, next_cursor = history_page(user_id, cursors[-1])
+    except Exception as e:
+        st.error("Failed to fetch transactions: " + str(e))
+        return
+
+    if df.empty and len(cursors) == 1:
+        st.write("No transactions found.")
+        return
+    st.dataframe(df, hide_index=True)
+
+    newer, page, older = st.columns([1, 2, 1])
+    if newer.button('Newer', disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    page.write(f"Page {len(cursors)}")
+    if older.button('Older', disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+
+    # The export runs when the button is clicked, writing a chunk of rows at a time to a temporary
+    # file that Streamlit reads from, the file is deleted once it is closed or garbage collected
+    export_format = st.selectbox('Export format', list(EXPORT_FORMATS))
+
+    st.download_button(
+        'Export all transactions', lambda: export_history(user_id, export_format), file_name=f"transactions.{export_format}",
+        mime=EXPORT_FORMATS[export_format][2],
+    )
 
 def delete_demo_account(user_id):
     """
@@ -61,30 +69,25 @@ def delete_demo_account(user_id):
     """
     
     if st.button('Delete Demo Account'):
-        conn = connect_to_database()
-        if conn:
-            try:
-                with conn.cursor() as cur:
-                    # fetch the demo_id to delete related transactions
-                    cur.execute("SELECT demo_id FROM demo_accounts WHERE user_id = %s;", (user_id,))
-                    demo_id = cur.fetchone()
-                    if demo_id:
-                        # Delete transactions related to this demo account
-                        cur.execute("DELETE FROM transactions WHERE demo_id = %s;", (demo_id[0],))
-
-                        # delete the demo account itself
-                        cur.execute("DELETE FROM demo_accounts WHERE user_id = %s;", (user_id,))
-                        conn.commit()
-                        st.success("Demo account and related transactions deleted successfully.")
-                    else:
-                        st.error("No demo account found for the given user.")
-            except Exception as e:
-                conn.rollback()  # Important to rollback in case of error
-                st.error("Failed to delete demo account: " + str(e))
-            finally:
-                conn.close()
-        else:
-            st.error("Failed to connect to the database.")
+        try:
+            # The deletes are committed together, or rolled back together if either fails
+            with db_transaction() as conn, conn.cursor() as cur:
+                # fetch the demo_id to delete related transactions
+                cur.execute("SELECT demo_id FROM demo_accounts WHERE user_id = %s;", (user_id,))
+                demo_id = cur.fetchone()
+                if demo_id:
+                    # Delete the positions and transactions related to this demo account
+                    cur.execute("DELETE FROM positions WHERE demo_id = %s;", (demo_id[0],))
+                    cur.execute("DELETE FROM transactions WHERE demo_id = %s;", (demo_id[0],))
+
+                    # delete the demo account itself
+                    cur.execute("DELETE FROM demo_accounts WHERE user_id = %s;", (user_id,))
+            if demo_id:
+                st.success("Demo account and related transactions deleted successfully.")
+            else:
+                st.error("No demo account found for the given user.")
+        except Exception as e:
+            st.error("Failed to delete demo account: " + str(e))
             
             
 def delete_user_account(user_id):
@@ -95,22 +98,17 @@ def delete_user_account(user_id):
     """
     # Logic to delete a user account
     if st.button('Delete User Account'):
-        conn = connect_to_database()
-        if conn:
-            try:
-                with conn.cursor() as cur:
-                    cur.execute("DELETE FROM users WHERE id = %s;", (user_id,))
-                    conn.commit()
-                    st.success("User account deleted successfully.")
-                    for key in list(st.session_state.keys()):
-                        del st.session_state[key]
-                        st.rerun()
-            except Exception as e:
-                st.error("Failed to delete user account: " + str(e))
-            finally:
-                conn.close()
-        else:
-            st.error("Failed to connect to the database.")
+        try:
+            with db_transaction() as conn, conn.cursor() as cur:
+                cur.execute("DELETE FROM users WHERE id = %s;", (user_id,))
+        except Exception as e:
+            st.error("Failed to delete user account: " + str(e))
+            return
+        # Rerun only after the delete is committed, the rerun interrupts the script
+        st.success("User account deleted successfully.")
+        for key in list(st.session_state.keys()):
+            del st.session_state[key]
+        st.rerun()
             
             
 
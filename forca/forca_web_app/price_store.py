@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import atomic_write, cache_path
+
+# Columns kept for every ticker, in this order
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class PriceStore:
+    """
+    Local on-disk store of daily bars, one folder of memory-mapped NumPy files per ticker.
+
+    The store remembers which date range it has already fetched for each ticker. A request only
+    downloads the dates before or after that range and merges them in, everything else is read
+    from disk as slices of the memory-mapped arrays.
+
+    The range only grows by fetches that returned bars. Every top-up also asks for the stored bar
+    next to the missing dates, so a successful fetch is never empty: an empty or failed one leaves
+    the range as it was, the stored bars are served and the next request tries again.
+
+    :param folder: Folder inside the cache folder for this store.
+    :param fetch: Function (ticker, start, end) returning a DataFrame of daily bars for the missing dates.
+    """
+
+    def __init__(self, folder, fetch):
+        self.folder = os.path.dirname(cache_path(folder, 'index'))
+        self.fetch = fetch
+        self.lock = threading.Lock()
+        self.ticker_locks = {}
+
+    def _ticker_lock(self, ticker):
+        with self.lock:
+            return self.ticker_locks.setdefault(ticker, threading.Lock())
+
+    def _ticker_folder(self, ticker):
+        return os.path.join(self.folder, ticker.replace('/', '_'))
+
+    def _read_meta(self, ticker):
+        try:
+            with open(os.path.join(self._ticker_folder(ticker), 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_arrays(self, ticker, meta):
+        folder = self._ticker_folder(ticker)
+        generation = meta['generation']
+        dates = np.load(os.path.join(folder, f"dates.{generation}.npy"), mmap_mode='r')
+        values = np.load(os.path.join(folder, f"values.{generation}.npy"), mmap_mode='r')
+        return dates, values
+
+    def _write(self, ticker, dates, values, covered_start, covered_end, old_meta):
+        """
+        Write a new generation of arrays, then switch meta.json over to it in one rename.
+        """
+        folder = self._ticker_folder(ticker)
+        generation = old_meta['generation'] + 1 if old_meta else 0
+        atomic_write(os.path.join(folder, f"dates.{generation}.npy"), lambda f: np.save(f, dates))
+        atomic_write(os.path.join(folder, f"values.{generation}.npy"), lambda f: np.save(f, values))
+        meta = {'generation': generation, 'covered_start': str(covered_start.date()), 'covered_end': str(covered_end.date())}
+        atomic_write(os.path.join(folder, 'meta.json'), lambda f: json.dump(meta, f), mode='w')
+
+        # Readers that still have the old files mapped keep their data until they let go of it
+        if old_meta:
+            for name in ('dates', 'values'):
+                try:
+                    os.remove(os.path.join(folder, f"{name}.{old_meta['generation']}.npy"))
+                except OSError:
+                    pass
+
+    def _fetch(self, ticker, start, end):
+        """
+        Fetch a date range and convert it to (dates, values) arrays.
+        """
+        df = self.fetch(ticker, start.date(), end.date())
+        if df is None or df.empty:
+            return np.empty(0, dtype='datetime64[ns]'), np.empty((0, len(COLUMNS)))
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        df = df.reindex(columns=COLUMNS)
+        keep = (index >= start) & (index < end)
+        return index.normalize().values[keep].astype('datetime64[ns]'), df.to_numpy(dtype=np.float64)[keep]
+
+    def _try_fetch(self, ticker, start, end):
+        """
+        Fetch a date range, returning None instead of raising or returning no bars.
+        """
+        try:
+            dates, values = self._fetch(ticker, start, end)
+        except Exception as e:
+            print(f"Could not fetch {ticker} prices from {start.date()} to {end.date()}: {e}")
+            return None
+        if not len(dates):
+            print(f"No {ticker} prices came back for {start.date()} to {end.date()}")
+            return None
+        return dates, values
+
+    def get(self, ticker, start, end):
+        """
+        Return the daily bars of a ticker from start up to (not including) end.
+
+        :param ticker: Ticker symbol.
+        :param start: First date.
+        :param end: Date to stop before.
+        :return: DataFrame with COLUMNS indexed by Date, backed by a slice of the memory-mapped file.
+                 Its attrs['covered'] holds the (start, end) range the store has fetched, None if nothing.
+        """
+        start = pd.Timestamp(start).normalize()
+        # Today's bar is not final yet, so neither the request nor the covered range reach past today.
+        # An end after today would otherwise never be covered and be downloaded again on every call.
+        end = min(pd.Timestamp(end).normalize(), pd.Timestamp.today().normalize())
+
+        with self._ticker_lock(ticker):
+            meta = self._read_meta(ticker)
+            dates, values = self._read_arrays(ticker, meta) if meta else (None, None)
+            if meta is None or not len(dates):
+                # No stored bars to extend, an empty store written before bars were required is refetched too
+                fetched = self._try_fetch(ticker, start, end) if start < end else None
+                if fetched is None:
+                    df = pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype=np.float64)
+                    df.attrs['covered'] = None
+                    return df
+                self._write(ticker, fetched[0], fetched[1], start, end, meta)
+            else:
+                covered_start = pd.Timestamp(meta['covered_start'])
+                covered_end = pd.Timestamp(meta['covered_end'])
+                new_start, new_end = covered_start, covered_end
+                parts = [(dates, values)]
+                # Only the missing dates on either side of the stored range are downloaded,
+                # together with the stored bar next to them
+                if start < covered_start:
+                    head = self._try_fetch(ticker, start, pd.Timestamp(dates[0]) + pd.Timedelta(days=1))
+                    if head is not None:
+                        parts.insert(0, head)
+                        new_start = start
+                if end > covered_end:
+                    tail = self._try_fetch(ticker, pd.Timestamp(dates[-1]), end)
+                    if tail is not None:
+                        parts.append(tail)
+                        new_end = end
+                if len(parts) > 1:
+                    dates = np.concatenate([part[0] for part in parts])
+                    values = np.concatenate([part[1] for part in parts])
+                    # A bar fetched again replaces the older copy
+                    dates, keep = np.unique(dates[::-1], return_index=True)
+                    values = values[::-1][keep]
+                    self._write(ticker, dates, values, new_start, new_end, meta)
+            meta = self._read_meta(ticker)
+            dates, values = self._read_arrays(ticker, meta)
+
+        lo, hi = np.searchsorted(dates, [start.to_datetime64(), end.to_datetime64()])
+        df = pd.DataFrame(values[lo:hi], index=pd.DatetimeIndex(dates[lo:hi], name='Date'), columns=COLUMNS, copy=False)
+        df.attrs['covered'] = (pd.Timestamp(meta['covered_start']), pd.Timestamp(meta['covered_end']))
+        return df
+
@@ -0,0 +1,141 @@
+"""
+Process-wide cache of latest prices, kept fresh by a background thread.
+
+Page renders read quotes from the cache without waiting for the network. Quotes older than
+FORCA_QUOTE_TTL seconds (60 by default) are refreshed in the background, and every
+FORCA_QUOTE_REFRESH_INTERVAL seconds (half the TTL by default) the refresher also fetches every
+symbol held in an open position, so portfolio pages find them fresh.
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+
+from database import db_transaction
+from market_data import quote_snapshot
+
+QUOTE_TTL = float(os.environ.get('FORCA_QUOTE_TTL', 60))
+REFRESH_INTERVAL = float(os.environ.get('FORCA_QUOTE_REFRESH_INTERVAL', QUOTE_TTL / 2))
+
+
+def held_symbols():
+    """
+    Return the symbols of every open position across all demo accounts.
+    """
+    with db_transaction() as conn, conn.cursor() as cur:
+        cur.execute("SELECT DISTINCT stock_symbol FROM positions WHERE open_trades > 0;")
+        return [row[0] for row in cur.fetchall()]
+
+
+class QuoteCache:
+    """
+    Latest price and fetch time per symbol.
+
+    :param ttl: Seconds after which a quote counts as stale.
+    :param refresh_interval: Seconds between two background refreshes.
+    :param symbols_source: Function returning the symbols the refresher keeps fresh.
+    """
+
+    def __init__(self, ttl=QUOTE_TTL, refresh_interval=REFRESH_INTERVAL, symbols_source=held_symbols):
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.symbols_source = symbols_source
+        self.lock = threading.Lock()
+        # Symbol to (price, time.time() of the fetch)
+        self.quotes = {}
+        # Stale symbols a page asked for since the last refresh
+        self.requested = set()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Start the background refresher thread.
+        """
+        self.thread = threading.Thread(target=self._run, name='quote-refresher', daemon=True)
+        self.thread.start()
+
+    def refresh(self, symbols):
+        """
+        Fetch the symbols in one request and store the prices that came back.
+        """
+        symbols = set(symbols)
+        if not symbols:
+            return
+        prices = quote_snapshot(symbols).dropna()
+        fetched_at = time.time()
+        with self.lock:
+            for symbol, price in prices.items():
+                self.quotes[symbol] = (float(price), fetched_at)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                requested, self.requested = self.requested, set()
+            try:
+                held = set(self.symbols_source())
+            except Exception as e:
+                print(f"Could not read the held symbols: {e}")
+                held = set()
+            try:
+                self.refresh(held | requested)
+            except Exception as e:
+                print(f"Quote refresh failed: {e}")
+            # A page asking for stale quotes wakes the refresher early
+            self.wake.wait(self.refresh_interval)
+            self.wake.clear()
+
+    def get(self, symbols, max_age=None):
+        """
+        Return the cached quotes of the symbols.
+
+        Symbols never fetched before are fetched in this call. Stale quotes are returned as they
+        are and refreshed in the background, unless max_age asks for fresher ones.
+
+        :param symbols: Iterable of ticker symbols.
+        :param max_age: Seconds, quotes older than this are fetched again before returning.
+        :return: DataFrame indexed by symbol with price, age (seconds) and stale columns.
+        """
+        symbols = sorted(set(symbols))
+        now = time.time()
+        with self.lock:
+            cached = {symbol: self.quotes.get(symbol) for symbol in symbols}
+
+        missing = [symbol for symbol, quote in cached.items() if quote is None or (max_age is not None and now - quote[1] > max_age)]
+        if missing:
+            try:
+                self.refresh(missing)
+            except Exception as e:
+                # Older quotes are still returned, symbols never fetched come back as NaN
+                print(f"Quote refresh failed: {e}")
+            now = time.time()
+            with self.lock:
+                cached = {symbol: self.quotes.get(symbol) for symbol in symbols}
+
+        prices = pd.Series({symbol: quote[0] for symbol, quote in cached.items() if quote}, index=symbols, dtype='float64')
+        ages = pd.Series({symbol: now - quote[1] for symbol, quote in cached.items() if quote}, index=symbols, dtype='float64')
+        snapshot = pd.DataFrame({'price': prices, 'age': ages, 'stale': ages > self.ttl})
+
+        stale = snapshot.index[snapshot['stale']]
+        if len(stale):
+            with self.lock:
+                self.requested.update(stale)
+            self.wake.set()
+        return snapshot
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_quote_cache():
+    """
+    Return the process-wide quote cache, starting its refresher the first time it is called.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QuoteCache()
+            _cache.start()
+    return _cache
@@ -0,0 +1,28 @@
+import requests
+from bs4 import BeautifulSoup
+
+from upstream import WIKIPEDIA
+
+SP500_URL = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+
+
+# The process of scraping the sp500 data was taken from the Beautiful Soup package https://realpython.com/beautiful-soup-web-scraper-python/
+def scrape_sp500_tickers():
+    """
+    Scrape S&P 500 ticker symbols and company names from Wikipedia.
+     
+    :return: List of tuples containing ticker symbols and company names.
+    """
+    # Concurrent scrapes share one request, and a failing Wikipedia is not retried on every call
+    html = WIKIPEDIA.call('sp500', lambda: requests.get(SP500_URL, timeout=30).text)
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', {'class': 'wikitable sortable'})
+    
+    # Initialize an empty list to store tickers
+    tickers = []
+    # Loop over each row in the table except the header row
+    for row in table.findAll('tr')[1:]:
+        ticker = row.findAll('td')[0].text.strip()
+        company_name = row.findAll('td')[1].text.strip()
+        tickers.append((ticker, company_name))
+    return tickers
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+# Root folder for everything the app persists on local disk (forecasts, prices, snapshots)
+CACHE_DIR = os.environ.get('FORCA_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.forcastock'))
+
+
+def cache_path(*parts):
+    """
+    Return a path inside the cache folder, creating its parent folders if needed.
+
+    :param parts: Path components relative to CACHE_DIR.
+    :return: Absolute path.
+    """
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def atomic_write(path, write, mode='wb'):
+    """
+    Write a file so readers never see it half written.
+
+    The content is written to a temporary file in the same folder which then replaces path.
+
+    :param path: Destination file.
+    :param write: Function called with the open temporary file.
+    :param mode: File mode for the temporary file.
+    """
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
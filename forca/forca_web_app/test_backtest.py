@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import storage
+from backtest import BacktestStore
+from forecasting import SEQUENCE_LENGTH
+from test_forecasting import random_lstm
+from windowing import sliding_windows
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'CACHE_DIR', str(tmp_path))
+
+
+def prices(n, seed=0):
+    close = 100 + np.cumsum(np.random.default_rng(seed).normal(0, 1, n))
+    # The extremes come first, so the scaler fit on any prefix is the one fit on the whole series
+    close[0], close[1] = close.max() + 10, close.min() - 10
+    return pd.DataFrame({'Close': close}, index=pd.bdate_range('2020-01-01', periods=n, name='Date'))
+
+
+def full_backtest(df, model, first_date):
+    """
+    Predict every bar from first_date on in one go, with the scaler fit on the whole series.
+    """
+    close = df['Close'].values.reshape(-1, 1)
+    scale = 1 / (close.max() - close.min())
+    offset = -close.min() * scale
+    start = int(df.index.searchsorted(first_date))
+    windows = sliding_windows(close * scale + offset, SEQUENCE_LENGTH)[start - SEQUENCE_LENGTH:len(close) - SEQUENCE_LENGTH]
+    return close[start:], (model.predict(windows) - offset) / scale
+
+
+def assert_metrics_match(backtest, actual, predicted):
+    errors = predicted - actual
+    metrics = backtest.metrics
+    assert metrics['n'] == len(errors)
+    assert metrics['rmse'] == pytest.approx(np.sqrt(np.mean(errors ** 2)))
+    assert metrics['mae'] == pytest.approx(np.mean(np.abs(errors)))
+    assert metrics['mape'] == pytest.approx(100 * np.mean(np.abs(errors / actual)))
+
+
+def test_incremental_updates_match_a_full_backtest():
+    model = random_lstm()
+    df = prices(400)
+    store = BacktestStore()
+
+    first = store.update('T', df.iloc[:300], model, 'hash')
+    first_date = first.dates[0]
+    for end in (320, 321, 400):
+        backtest = store.update('T', df.iloc[:end], model, 'hash')
+
+    actual, predicted = full_backtest(df, model, first_date)
+    np.testing.assert_array_equal(backtest.dates, df.index.values[len(df) - len(actual):])
+    np.testing.assert_allclose(backtest.actual, actual)
+    np.testing.assert_allclose(backtest.predicted, predicted, rtol=1e-5)
+    assert_metrics_match(backtest, actual, predicted)
+
+    # A new store reads the same backtest from disk
+    reloaded = BacktestStore().update('T', df, model, 'hash')
+    np.testing.assert_allclose(reloaded.predicted, predicted, rtol=1e-5)
+    assert store.all_metrics()['T']['n'] == len(actual)
+
+
+def test_changed_last_close_is_scored_again():
+    model = random_lstm()
+    df = prices(350)
+    store = BacktestStore()
+    store.update('T', df.iloc[:300], model, 'hash')
+
+    # The last bar was intraday when it was scored, its final close differs
+    intraday = df.iloc[:320].copy()
+    intraday.iloc[-1, 0] += 0.5
+    first_date = store.update('T', intraday, model, 'hash').dates[0]
+    backtest = store.update('T', df, model, 'hash')
+
+    actual, predicted = full_backtest(df, model, first_date)
+    np.testing.assert_allclose(backtest.actual, actual)
+    np.testing.assert_allclose(backtest.predicted, predicted, rtol=1e-5)
+    assert_metrics_match(backtest, actual, predicted)
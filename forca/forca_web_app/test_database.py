@@ -0,0 +1,64 @@
+import psycopg2
+import pytest
+
+import database
+
+
+class Connection:
+    """
+    Stands in for a psycopg2 connection, failing commit and rollback with the given errors.
+    """
+
+    def __init__(self, commit_error=None, rollback_error=None):
+        self.closed = 0
+        self.commit_error = commit_error
+        self.rollback_error = rollback_error
+
+    def commit(self):
+        if self.commit_error:
+            raise self.commit_error
+
+    def rollback(self):
+        if self.rollback_error:
+            raise self.rollback_error
+
+
+@pytest.fixture
+def returned(monkeypatch):
+    """
+    Hand out a prepared connection and record how it goes back to the pool.
+    """
+    calls = []
+    monkeypatch.setattr(database, 'release_connection', lambda conn, close=False: calls.append(close))
+    return calls
+
+
+def run(conn, monkeypatch):
+    monkeypatch.setattr(database, 'get_connection', lambda: conn)
+    with database.db_transaction():
+        pass
+
+
+def test_committed_connection_is_reused(returned, monkeypatch):
+    run(Connection(), monkeypatch)
+    assert returned == [False]
+
+
+def test_failed_rollback_does_not_mask_the_commit_error(returned, monkeypatch):
+    conn = Connection(commit_error=psycopg2.OperationalError('server closed the connection'),
+                      rollback_error=psycopg2.InterfaceError('connection already closed'))
+    with pytest.raises(psycopg2.OperationalError):
+        run(conn, monkeypatch)
+    assert returned == [True]
+
+
+def test_connection_error_closes_the_connection(returned, monkeypatch):
+    with pytest.raises(psycopg2.InterfaceError):
+        run(Connection(commit_error=psycopg2.InterfaceError('cursor already closed')), monkeypatch)
+    assert returned == [True]
+
+
+def test_other_errors_keep_the_connection(returned, monkeypatch):
+    with pytest.raises(psycopg2.IntegrityError):
+        run(Connection(commit_error=psycopg2.IntegrityError('duplicate key')), monkeypatch)
+    assert returned == [False]
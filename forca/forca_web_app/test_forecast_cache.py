@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from forecast_cache import forecast_key
+
+
+def prices(close):
+    return pd.DataFrame({'Close': close}, index=pd.bdate_range('2024-01-01', periods=len(close), name='Date'))
+
+
+def test_key_changes_with_a_revised_close():
+    df = prices(np.arange(100, 130, dtype=np.float64))
+    revised = df.copy()
+    revised.iloc[-1, 0] += 0.25
+    assert forecast_key('T', df, 'hash') != forecast_key('T', revised, 'hash')
+    assert forecast_key('T', df, 'hash') != forecast_key('T', df, 'other')
+
+
+def test_float32_and_float64_closes_share_a_key():
+    df = prices(100 + np.random.default_rng(0).random(30))
+    assert forecast_key('T', df, 'hash') == forecast_key('T', df.astype(np.float32), 'hash')
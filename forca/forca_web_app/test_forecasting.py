@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from forecasting import SEQUENCE_LENGTH, rollout, simulate_paths
+from numpy_lstm import NumpyLSTM
+
+UNITS = 8
+
+
+def random_lstm(seed=0):
+    rng = np.random.default_rng(seed)
+    return NumpyLSTM(rng.normal(0, 0.3, (1, 4 * UNITS)), rng.normal(0, 0.3, (UNITS, 4 * UNITS)), rng.normal(0, 0.1, 4 * UNITS),
+                     rng.normal(0, 0.3, (UNITS, 1)), rng.normal(0, 0.1, 1))
+
+
+def random_sequence(seed=0):
+    prices = 100 + np.cumsum(np.random.default_rng(seed).normal(0, 1, SEQUENCE_LENGTH))
+    return ((prices - prices.min()) / (prices.max() - prices.min())).reshape(-1, 1).astype(np.float32)
+
+
+def legacy_rollout(model, last_sequence, n_future_steps):
+    # The original predict_future_prices loop
+    future_predictions = []
+    current_sequence = last_sequence.copy()
+    for _ in range(n_future_steps):
+        predicted = model.predict(current_sequence.reshape(1, SEQUENCE_LENGTH, 1), verbose=0)
+        future_predictions.append(predicted[0][0])
+        current_sequence = np.roll(current_sequence, -1)
+        current_sequence[-1] = predicted
+    return np.array(future_predictions)
+
+
+def test_rollout_matches_legacy_loop():
+    model = random_lstm()
+    sequence = random_sequence()
+    np.testing.assert_allclose(rollout(model, sequence, 15), legacy_rollout(model, sequence, 15), rtol=1e-5, atol=1e-6)
+
+
+def test_rollout_batch_matches_single_sequences():
+    model = random_lstm()
+    sequences = np.stack([random_sequence(seed)[:, 0] for seed in range(3)])
+    batch = rollout(model, sequences, 10)
+    assert batch.shape == (3, 10)
+    for sequence, predictions in zip(sequences, batch):
+        np.testing.assert_allclose(predictions, rollout(model, sequence, 10), rtol=1e-5, atol=1e-6)
+
+
+def test_rollout_without_steps():
+    assert rollout(random_lstm(), random_sequence(), 0).shape == (0,)
+
+
+def test_simulate_paths_without_noise_is_the_rollout():
+    model = random_lstm()
+    sequence = random_sequence()
+    paths = simulate_paths(model, sequence, np.zeros(5), 8, n_samples=4)
+    assert paths.shape == (4, 8)
+    np.testing.assert_allclose(paths, np.broadcast_to(rollout(model, sequence, 8), (4, 8)), rtol=1e-5, atol=1e-6)
+
+
+def test_graph_rollout_matches_legacy_loop():
+    keras = pytest.importorskip('keras')
+    model = keras.Sequential([keras.Input((SEQUENCE_LENGTH, 1)), keras.layers.LSTM(UNITS), keras.layers.Dropout(0.2), keras.layers.Dense(1)])
+    sequence = random_sequence()
+    np.testing.assert_allclose(rollout(model, sequence, 5), legacy_rollout(model, sequence, 5), rtol=1e-4, atol=1e-5)
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import numpy as np
+
+import model_registry
+from inference_server import MicroBatcher
+from model_registry import ModelRegistry
+from test_forecasting import random_lstm
+
+
+def test_concurrent_requests_get_their_own_rows():
+    model = random_lstm()
+    batcher = MicroBatcher(model, max_wait_ms=50)
+    inputs = [np.random.default_rng(seed).random((seed + 1, 20, 1)).astype(np.float32) for seed in range(6)]
+    results = [None] * len(inputs)
+
+    def call(i):
+        results[i] = batcher.predict(inputs[i])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for x, result in zip(inputs, results):
+        np.testing.assert_allclose(result, model.predict(x), rtol=1e-6)
+    assert batcher.metrics()['requests'] == len(inputs)
+    batcher.close()
+
+
+def test_close_stops_the_worker_and_keeps_predicting():
+    model = random_lstm()
+    batcher = MicroBatcher(model)
+    x = np.random.default_rng(0).random((3, 20, 1)).astype(np.float32)
+    batcher.predict(x)
+    batcher.close()
+    assert not batcher.worker.is_alive()
+    # Callers still holding a closed batcher run the model themselves
+    np.testing.assert_allclose(batcher.predict(x), model.predict(x), rtol=1e-6)
+    batcher.close()
+
+
+def test_swap_closes_the_replaced_version(monkeypatch):
+    monkeypatch.setattr(model_registry, 'load_forecast_model', lambda path, backend: random_lstm())
+    monkeypatch.setattr(model_registry, 'file_hash', lambda path: path)
+    registry = ModelRegistry(model_dir='models')
+    old = registry._swap_to('1')
+    new = registry._swap_to('2')
+    assert registry.active is new
+    assert not old.batcher.worker.is_alive()
+    assert new.batcher.worker.is_alive()
+    new.close()
+
+
+def test_lone_request_is_not_held_for_the_wait():
+    model = random_lstm()
+    batcher = MicroBatcher(model, max_wait_ms=500)
+    x = np.random.default_rng(0).random((1, 20, 1)).astype(np.float32)
+    started = time.perf_counter()
+    for _ in range(5):
+        batcher.predict(x)
+    # Five sequential calls, each would wait 0.5 s if a lone request waited for company
+    assert time.perf_counter() - started < 1
+    batcher.close()
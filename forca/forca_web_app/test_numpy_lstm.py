@@ -0,0 +1,57 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from numpy_lstm import NumpyLSTM, load_numpy_lstm
+
+keras = pytest.importorskip('keras')
+
+
+@pytest.fixture(scope='module')
+def keras_model_path(tmp_path_factory):
+    keras.utils.set_random_seed(0)
+    model = keras.Sequential([keras.Input((30, 1)), keras.layers.LSTM(16), keras.layers.Dropout(0.2), keras.layers.Dense(1)])
+    path = str(tmp_path_factory.mktemp('model') / 'model.keras')
+    model.save(path)
+    return path
+
+
+def test_predictions_match_keras(keras_model_path):
+    x = np.random.default_rng(0).random((5, 30, 1)).astype(np.float32)
+    expected = keras.models.load_model(keras_model_path).predict(x, verbose=0)
+    np.testing.assert_allclose(NumpyLSTM.from_keras_archive(keras_model_path).predict(x), expected, rtol=1e-4, atol=1e-5)
+
+
+def test_weights_are_cached_next_to_the_model(keras_model_path):
+    model = load_numpy_lstm(keras_model_path)
+    assert os.path.exists(keras_model_path + '.npz')
+    cached = load_numpy_lstm(keras_model_path)
+    x = np.random.default_rng(1).random((2, 30))
+    np.testing.assert_array_equal(cached.predict(x), model.predict(x))
+
+
+def test_unsupported_architecture_is_rejected(tmp_path):
+    model = keras.Sequential([keras.Input((30, 1)), keras.layers.LSTM(4, return_sequences=True), keras.layers.LSTM(4), keras.layers.Dense(1)])
+    path = str(tmp_path / 'stacked.keras')
+    model.save(path)
+    with pytest.raises(ValueError):
+        NumpyLSTM.from_keras_archive(path)
+
+
+def test_replaced_model_with_an_older_mtime_is_read_again(keras_model_path, tmp_path):
+    path = str(tmp_path / 'model.keras')
+    shutil.copyfile(keras_model_path, path)
+    load_numpy_lstm(path)
+
+    # A different model copied over with its old modification time kept, as cp -p or rsync do
+    keras.utils.set_random_seed(1)
+    other = keras.Sequential([keras.Input((30, 1)), keras.layers.LSTM(16), keras.layers.Dropout(0.2), keras.layers.Dense(1)])
+    other_path = str(tmp_path / 'other.keras')
+    other.save(other_path)
+    os.utime(other_path, ns=(0, 0))
+    shutil.copy2(other_path, path)
+
+    x = np.random.default_rng(2).random((2, 30))
+    np.testing.assert_array_equal(load_numpy_lstm(path).predict(x), NumpyLSTM.from_keras_archive(other_path).predict(x))
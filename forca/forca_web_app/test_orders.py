@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+import orders
+from orders import close_position, margin_for, open_position
+
+
+class Database:
+    """
+    Stands in for the connection pool, recording the parameters of every statement and answering
+    each with the prepared row.
+    """
+
+    def __init__(self):
+        self.executed = []
+        self.row = (42,)
+
+    @contextmanager
+    def db_transaction(self):
+        yield self
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, sql, params):
+        self.executed.append(params)
+
+    def fetchone(self):
+        return self.row
+
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    database = Database()
+    monkeypatch.setattr(orders, 'db_transaction', database.db_transaction)
+    return database
+
+
+@pytest.mark.parametrize('price', [float('nan'), float('inf'), -float('inf'), np.float64('nan'), 0, -1.5, None, '10'])
+def test_invalid_price_is_rejected(database, price):
+    success, message = open_position(1, 'BUY', 'T', 10, price)
+    assert not success and 'price' in message
+    success, message = close_position(1, 7, 'T', price)
+    assert not success and 'price' in message
+    assert database.executed == []
+
+
+@pytest.mark.parametrize('quantity', [0, -5, 2.5, float('nan'), None])
+def test_invalid_quantity_is_rejected(database, quantity):
+    success, message = open_position(1, 'BUY', 'T', quantity, 10.0)
+    assert not success and 'quantity' in message
+    assert database.executed == []
+
+
+def test_numpy_values_are_sent_as_python_numbers(database):
+    psycopg2 = pytest.importorskip('psycopg2')
+
+    assert open_position(1, 'BUY', 'T', np.int64(3), np.float32(10.5))[0]
+    params = database.executed[-1]
+    assert (type(params['quantity']), params['quantity']) == (int, 3)
+    assert (type(params['price']), params['price']) == (float, 10.5)
+    assert (type(params['margin']), params['margin']) == (float, 3.15)
+    for value in params.values():
+        psycopg2.extensions.adapt(value)
+
+    database.row = ('SELL', 3, 1.5)
+    assert close_position(1, np.int64(7), 'T', np.float32(11.0))[0]
+    params = database.executed[-1]
+    assert (type(params['transaction_id']), params['transaction_id']) == (int, 7)
+    assert (type(params['price']), params['price']) == (float, 11.0)
+    for value in params.values():
+        psycopg2.extensions.adapt(value)
+
+
+def test_margin():
+    assert margin_for(12.34, 10) == 12.34
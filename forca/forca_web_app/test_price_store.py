@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import storage
+from market_data import HistoryCache
+from price_store import COLUMNS, PriceStore
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'CACHE_DIR', str(tmp_path))
+
+
+BARS = pd.DataFrame(np.random.default_rng(0).random((520, len(COLUMNS))) * 100, columns=COLUMNS,
+                    index=pd.bdate_range('2023-01-02', periods=520, name='Date'))
+
+
+class Fetcher:
+    """
+    Serves BARS, failing the way yfinance does (an empty frame) or by raising while told to.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.failure = None
+
+    def __call__(self, ticker, start, end):
+        self.calls.append((pd.Timestamp(start), pd.Timestamp(end)))
+        if self.failure == 'empty':
+            return BARS.iloc[:0]
+        if self.failure == 'raise':
+            raise RuntimeError('rate limited')
+        return BARS[(BARS.index >= pd.Timestamp(start)) & (BARS.index < pd.Timestamp(end))]
+
+
+def expected(start, end):
+    return BARS[(BARS.index >= pd.Timestamp(start)) & (BARS.index < pd.Timestamp(end))]
+
+
+def assert_bars(df, start, end):
+    pd.testing.assert_frame_equal(df, expected(start, end), check_freq=False, check_names=False, check_index_type=False)
+
+
+@pytest.mark.parametrize('failure', ['empty', 'raise'])
+def test_failed_first_fetch_is_retried(failure):
+    fetch = Fetcher()
+    store = PriceStore('prices', fetch)
+
+    fetch.failure = failure
+    df = store.get('T', '2023-03-01', '2023-06-01')
+    assert df.empty
+    assert df.attrs['covered'] is None
+
+    fetch.failure = None
+    assert_bars(store.get('T', '2023-03-01', '2023-06-01'), '2023-03-01', '2023-06-01')
+    assert len(fetch.calls) == 2
+    # Covered now, served from disk
+    store.get('T', '2023-04-01', '2023-05-01')
+    assert len(fetch.calls) == 2
+
+
+@pytest.mark.parametrize('failure', ['empty', 'raise'])
+def test_failed_top_up_is_retried(failure):
+    fetch = Fetcher()
+    store = PriceStore('prices', fetch)
+    store.get('T', '2023-03-01', '2023-06-01')
+
+    fetch.failure = failure
+    df = store.get('T', '2023-01-15', '2023-09-01')
+    # The stored bars are served, the failed dates are not marked as covered
+    assert_bars(df, '2023-03-01', '2023-06-01')
+    assert df.attrs['covered'] == (pd.Timestamp('2023-03-01'), pd.Timestamp('2023-06-01'))
+
+    fetch.failure = None
+    calls = len(fetch.calls)
+    assert_bars(store.get('T', '2023-01-15', '2023-09-01'), '2023-01-15', '2023-09-01')
+    assert len(fetch.calls) == calls + 2
+    assert store.get('T', '2023-01-15', '2023-09-01').attrs['covered'] == (pd.Timestamp('2023-01-15'), pd.Timestamp('2023-09-01'))
+
+
+def test_top_up_refetches_the_neighbouring_bar():
+    fetch = Fetcher()
+    store = PriceStore('prices', fetch)
+    store.get('T', '2023-03-01', '2023-06-03')
+    # A weekend with no new bars still returns the stored Friday, so an empty answer always means failure
+    store.get('T', '2023-03-01', '2023-06-05')
+    last_stored = BARS.index[BARS.index < '2023-06-03'][-1]
+    assert fetch.calls[-1] == (last_stored, pd.Timestamp('2023-06-05'))
+    assert_bars(store.get('T', '2023-03-01', '2023-06-05'), '2023-03-01', '2023-06-05')
+
+
+def test_history_cache_asks_again_after_a_failed_top_up():
+    fetch = Fetcher()
+    cache = HistoryCache(PriceStore('prices', fetch).get)
+    cache.get('T', '2023-03-01', '2023-06-01')
+
+    fetch.failure = 'empty'
+    assert len(cache.get('T', '2023-03-01', '2023-09-01')) == len(expected('2023-03-01', '2023-06-01'))
+
+    fetch.failure = None
+    assert len(cache.get('T', '2023-03-01', '2023-09-01')) == len(expected('2023-03-01', '2023-09-01'))
+
+
+def test_end_after_today_is_not_downloaded_again(monkeypatch):
+    fetch = Fetcher()
+    store = PriceStore('prices', fetch)
+    monkeypatch.setattr(pd.Timestamp, 'today', classmethod(lambda cls: pd.Timestamp('2023-06-01 15:30')))
+    cache = HistoryCache(store.get)
+    df = cache.get('T', '2023-03-01', '2023-06-10')
+    assert_bars(df.astype(np.float64), '2023-03-01', '2023-06-01')
+    cache.get('T', '2023-03-01', '2023-06-10')
+    store.get('T', '2023-03-01', '2023-06-10')
+    assert len(fetch.calls) == 1
+
+
+def test_history_cache_keeps_volume_exact():
+    bars = BARS.copy()
+    bars['Volume'] = 123456789.0
+    cache = HistoryCache(lambda ticker, start, end: bars[(bars.index >= start) & (bars.index < end)])
+    df = cache.get('T', '2023-03-01', '2023-06-01')
+    assert df['Close'].dtype == np.float32
+    assert df['Volume'].dtype == np.float64
+    assert (df['Volume'] == 123456789).all()
@@ -0,0 +1,38 @@
+import ticker_registry
+from ticker_registry import TickerRegistry, TickerUniverse
+
+
+def test_search_matches_ticker_and_company():
+    universe = TickerUniverse([('MSFT', 'Microsoft'), ('AAPL', 'Apple Inc.'), ('AMZN', 'Amazon')])
+    assert universe.options == ['AAPL - Apple Inc.', 'AMZN - Amazon', 'MSFT - Microsoft']
+    assert universe.search('a') == ['AAPL - Apple Inc.', 'AMZN - Amazon']
+    assert universe.search('MICRO') == ['MSFT - Microsoft']
+    assert universe.search('zz') == []
+
+
+def test_empty_universe_is_scraped_again_on_demand(tmp_path, monkeypatch):
+    answers = [RuntimeError('Wikipedia is down'), [('AAPL', 'Apple Inc.')]]
+    calls = []
+
+    def scrape():
+        calls.append(1)
+        answer = answers[min(len(calls), len(answers)) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    registry = TickerRegistry(path=str(tmp_path / 'sp500.json'), scrape=scrape)
+    assert len(registry.universe) == 0
+    # Within the retry interval the empty universe is returned without scraping
+    assert len(registry.current()) == 0
+    assert len(calls) == 1
+
+    monkeypatch.setattr(ticker_registry, 'EMPTY_RETRY_INTERVAL', 0)
+    assert registry.current().options == ['AAPL - Apple Inc.']
+    assert len(calls) == 2
+    # A loaded universe is not scraped again on demand
+    registry.current()
+    assert len(calls) == 2
+    # The next process starts from the saved snapshot
+    assert TickerRegistry(path=str(tmp_path / 'sp500.json'), scrape=scrape).universe.symbols == ['AAPL']
+    assert len(calls) == 2
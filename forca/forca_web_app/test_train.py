@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+from train import list_price_files, load_scaled_close
+
+
+def test_parquet_and_csv_files_are_read(tmp_path):
+    df = pd.DataFrame({'Close': np.linspace(10, 20, 50)}, index=pd.bdate_range('2024-01-01', periods=50, name='Date'))
+    df.to_parquet(tmp_path / 'AAA.parquet')
+    df.to_csv(tmp_path / 'BBB.csv')
+    # A ticker with both files is read from parquet
+    df.to_csv(tmp_path / 'AAA.csv')
+    (tmp_path / 'notes.txt').write_text('')
+
+    paths = list_price_files(str(tmp_path))
+    assert [p.rsplit('/', 1)[1] for p in paths] == ['AAA.parquet', 'BBB.csv']
+    assert [p.rsplit('/', 1)[1] for p in list_price_files(str(tmp_path), ['BBB'])] == ['BBB.csv']
+    for path in paths:
+        np.testing.assert_allclose(load_scaled_close(path, start='2024-01-08'), np.linspace(0, 1, 45), rtol=1e-6)
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+import market_data
+import upstream
+from market_data import YFinanceProvider
+from upstream import CircuitOpenError, Upstream
+
+yf = pytest.importorskip('yfinance')
+from yfinance.exceptions import YFPricesMissingError, YFRateLimitError  # noqa: E402
+
+
+@pytest.fixture
+def ticker(monkeypatch):
+    """
+    Replace yf.Ticker with one whose history answers with the prepared outcome.
+    """
+    class Ticker:
+        calls = []
+        outcome = None
+
+        def __init__(self, symbol):
+            self.symbol = symbol
+
+        def history(self, **kwargs):
+            Ticker.calls.append(self.symbol)
+            if isinstance(Ticker.outcome, Exception):
+                raise Ticker.outcome
+            return Ticker.outcome
+
+    monkeypatch.setattr(yf, 'Ticker', Ticker)
+    monkeypatch.setattr(market_data, 'YAHOO', Upstream('Yahoo Finance'))
+    return Ticker
+
+
+def test_raised_errors_open_the_breaker(ticker):
+    ticker.outcome = YFRateLimitError()
+    provider = YFinanceProvider()
+    for _ in range(upstream.FAILURE_THRESHOLD):
+        with pytest.raises(YFRateLimitError):
+            provider.history('T', '2024-01-01', '2024-02-01')
+    assert len(ticker.calls) == upstream.FAILURE_THRESHOLD
+
+    # Open now, callers fail fast without another request
+    with pytest.raises(CircuitOpenError):
+        provider.history('U', '2024-01-01', '2024-02-01')
+    assert len(ticker.calls) == upstream.FAILURE_THRESHOLD
+
+
+@pytest.mark.parametrize('outcome', ['missing', 'empty'])
+def test_bad_tickers_and_empty_ranges_do_not_open_the_breaker(ticker, outcome):
+    ticker.outcome = YFPricesMissingError('BRK.B', '') if outcome == 'missing' else pd.DataFrame()
+    provider = YFinanceProvider()
+    for _ in range(2 * upstream.FAILURE_THRESHOLD):
+        assert provider.history('BRK.B', '2024-01-06', '2024-01-08').empty
+    assert len(ticker.calls) == 2 * upstream.FAILURE_THRESHOLD
+
+
+def test_history_index_is_timezone_naive(ticker):
+    index = pd.DatetimeIndex(['2024-01-02', '2024-01-03'], name='Date').tz_localize('America/New_York')
+    ticker.outcome = pd.DataFrame({'Close': [1.0, 2.0]}, index=index)
+    df = YFinanceProvider().history('T', '2024-01-01', '2024-01-04')
+    assert df.index.tz is None
+    assert list(df.index) == [pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-03')]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from windowing import last_window, sliding_windows
+
+
+def legacy_sequences(data, sequence_length):
+    # The original create_sequences loop
+    X, y = [], []
+    for i in range(len(data) - sequence_length):
+        X.append(data[i:i + sequence_length])
+        y.append(data[i + sequence_length])
+    return np.array(X), np.array(y)
+
+
+@pytest.mark.parametrize('shape', [(50,), (50, 1)])
+def test_sliding_windows_match_legacy_loop(shape):
+    data = np.random.default_rng(0).random(shape)
+    X, y = legacy_sequences(data, 7)
+    windows = sliding_windows(data, 7)
+    np.testing.assert_array_equal(windows[:-1], X)
+    np.testing.assert_array_equal(data[7:], y)
+    assert windows.shape == (44,) + (7,) + shape[1:]
+
+
+def test_sliding_windows_share_memory():
+    data = np.arange(10.0)
+    windows = sliding_windows(data, 4)
+    assert np.shares_memory(windows, data)
+    assert not windows.flags.writeable
+
+
+def test_sliding_windows_shorter_than_window():
+    assert sliding_windows(np.arange(3.0).reshape(-1, 1), 5).shape == (0, 5, 1)
+
+
+def test_last_window():
+    data = np.arange(20.0).reshape(-1, 1)
+    np.testing.assert_array_equal(last_window(data, 5, offset=1), sliding_windows(data, 5)[-2])
+    with pytest.raises(ValueError):
+        last_window(data, 20, offset=1)
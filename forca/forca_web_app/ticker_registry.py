@@ -0,0 +1,183 @@
+"""
+The S&P 500 ticker universe shared by every page.
+
+The list scraped from Wikipedia is saved on local disk, so a new process starts from the saved
+snapshot instead of scraping again. The snapshot is scraped again every
+FORCA_TICKERS_REFRESH_INTERVAL seconds (one day by default) in a background thread. While there
+is no universe at all, because the first scrape failed, pages scrape on demand at most every
+EMPTY_RETRY_INTERVAL seconds.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+from sp500 import scrape_sp500_tickers
+from storage import atomic_write, cache_path
+
+REFRESH_INTERVAL = float(os.environ.get('FORCA_TICKERS_REFRESH_INTERVAL', 24 * 60 * 60))
+# Seconds between two on-demand scrapes while the universe is empty
+EMPTY_RETRY_INTERVAL = 30
+
+
+class TickerUniverse:
+    """
+    Immutable list of tickers with the selectbox options and a search index built once.
+
+    :param tickers: List of (ticker symbol, company name) tuples.
+    """
+
+    def __init__(self, tickers):
+        self.tickers = list(tickers)
+        self.names = dict(self.tickers)
+        # "TICKER - Company" options for the selectboxes, sorted once instead of on every rerun
+        self.options = sorted(f"{ticker} - {company}" for ticker, company in self.tickers)
+        self.symbols = [option.split(" - ")[0] for option in self.options]
+        self.option_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # Suffix array over the lower-cased options: every substring of an option is a prefix of one
+        # of its suffixes, so all matches of a query sit next to each other in the sorted list
+        suffixes = sorted(
+            (option.lower()[start:], i)
+            for i, option in enumerate(self.options)
+            for start in range(len(option))
+        )
+        self.suffixes = [suffix for suffix, _ in suffixes]
+        self.suffix_owners = [i for _, i in suffixes]
+
+    def __len__(self):
+        return len(self.options)
+
+    def option_for(self, symbol):
+        """
+        :return: The selectbox option of a ticker symbol, None if it is not in the universe.
+        """
+        i = self.option_index.get(symbol)
+        return None if i is None else self.options[i]
+
+    def search(self, query, limit=None):
+        """
+        Find the options containing query in their ticker or company name, ignoring case.
+
+        :param query: Text to look for.
+        :param limit: Maximum number of options to return, None for all of them.
+        :return: Matching options in the same order as options.
+        """
+        query = query.strip().lower()
+        if not query:
+            return self.options[:limit]
+        start = bisect.bisect_left(self.suffixes, query)
+        matches = set()
+        for position in range(start, len(self.suffixes)):
+            if not self.suffixes[position].startswith(query):
+                break
+            matches.add(self.suffix_owners[position])
+        return [self.options[i] for i in sorted(matches)][:limit]
+
+
+class TickerRegistry:
+    """
+    Keeps the current TickerUniverse, loaded from the local snapshot and refreshed on a schedule.
+
+    :param path: Snapshot file.
+    :param refresh_interval: Seconds after which the snapshot is scraped again.
+    :param scrape: Function returning the list of (ticker symbol, company name) tuples.
+    """
+
+    def __init__(self, path=None, refresh_interval=REFRESH_INTERVAL, scrape=scrape_sp500_tickers):
+        self.path = path or cache_path('tickers', 'sp500.json')
+        self.refresh_interval = refresh_interval
+        self.scrape = scrape
+        self.fetched_at = 0.0
+        self.universe = TickerUniverse([])
+        self.lock = threading.Lock()
+        self.last_attempt = float('-inf')
+
+        snapshot = self._read_snapshot()
+        if snapshot:
+            self.fetched_at = snapshot['fetched_at']
+            self.universe = TickerUniverse(tuple(entry) for entry in snapshot['tickers'])
+        if not len(self.universe):
+            # Nothing saved yet, the first visitor has to wait for one scrape
+            self.current()
+
+    def _read_snapshot(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def refresh(self):
+        """
+        Scrape the universe again, save it and swap it in. A failed scrape keeps the current universe.
+        """
+        try:
+            tickers = self.scrape()
+        except Exception as e:
+            print(f"Failed to refresh the ticker universe: {e}")
+            return
+        if not tickers:
+            return
+        fetched_at = time.time()
+        atomic_write(self.path, lambda f: json.dump({'fetched_at': fetched_at, 'tickers': tickers}, f), mode='w')
+        # Readers holding the old universe keep using it, new readers get the new one
+        self.universe = TickerUniverse(tickers)
+        self.fetched_at = fetched_at
+
+    def current(self):
+        """
+        Return the universe, scraping it first if it is still empty.
+
+        An empty universe is scraped again at most every EMPTY_RETRY_INTERVAL seconds, sessions
+        arriving meanwhile get the empty universe right away.
+
+        :return: TickerUniverse.
+        """
+        if not len(self.universe):
+            with self.lock:
+                if not len(self.universe) and time.monotonic() - self.last_attempt >= EMPTY_RETRY_INTERVAL:
+                    self.last_attempt = time.monotonic()
+                    self.refresh()
+        return self.universe
+
+    def start_refresher(self):
+        """
+        Refresh the universe in a background thread whenever the snapshot gets older than refresh_interval.
+        """
+        threading.Thread(target=self._run, name='ticker-refresher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            wait = self.fetched_at + self.refresh_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            self.refresh()
+            if time.time() - self.fetched_at >= self.refresh_interval:
+                # The scrape failed, try again a bit later instead of hammering Wikipedia
+                time.sleep(min(self.refresh_interval, 15 * 60))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_ticker_registry():
+    """
+    Return the process-wide ticker registry, starting its refresher the first time it is called.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TickerRegistry()
+            _registry.start_refresher()
+    return _registry
+
+
+def get_ticker_universe():
+    """
+    Return the current ticker universe, scraping it on demand while it is empty.
+    """
+    return get_ticker_registry().current()
@@ -0,0 +1,178 @@
+"""
+Retrain the LSTM model on the price history of many tickers with bounded memory.
+
+Windows are generated lazily from one ticker file at a time and streamed through tf.data, so
+memory use depends on the shuffle buffer and not on the size of the dataset. Run from the
+forca_web_app folder:
+
+    python train.py --prices-dir fixtures/prices --output ../my_lstm_model.keras
+
+The saved model has the same architecture and input shape as the shipped model and can be used
+as MODEL_PATH directly.
+"""
+import argparse
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+from forecasting import SEQUENCE_LENGTH
+from windowing import sliding_windows
+
+# Fraction of every ticker's history used for training, the rest is used for validation
+TRAIN_FRACTION = 0.8
+# Price file formats read, in order of preference when a ticker has both, as in FixtureProvider
+PRICE_FILE_EXTENSIONS = ('.parquet', '.csv')
+
+
+def list_price_files(prices_dir, tickers=None):
+    """
+    Return the <TICKER>.parquet or <TICKER>.csv file of every ticker in prices_dir, optionally
+    limited to the given tickers. A ticker with both files is read from the parquet one.
+    """
+    files = {}
+    for name in sorted(os.listdir(prices_dir)):
+        ticker, extension = os.path.splitext(name)
+        if extension in PRICE_FILE_EXTENSIONS and (ticker not in files or extension == PRICE_FILE_EXTENSIONS[0]):
+            files[ticker] = name
+    if tickers:
+        files = {ticker: name for ticker, name in files.items() if ticker in set(tickers)}
+    return [os.path.join(prices_dir, files[ticker]) for ticker in sorted(files)]
+
+
+def load_scaled_close(path, start=None, end=None):
+    """
+    Load one ticker's Close prices and scale them to [0, 1] on their own.
+
+    :param path: Parquet or CSV file indexed by date.
+    :param start: Optional first date to keep.
+    :param end: Optional date to stop before.
+    :return: 1-D float32 array of scaled Close prices.
+    """
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+    if start:
+        df = df[df.index >= pd.Timestamp(start)]
+    if end:
+        df = df[df.index < pd.Timestamp(end)]
+    close = df['Close'].dropna().to_numpy(dtype=np.float32)
+    if len(close) == 0:
+        return close
+    low, high = close.min(), close.max()
+    return (close - low) / (high - low) if high > low else np.zeros_like(close)
+
+
+def window_generator(paths, split, cycle_length=8, seed=None, start=None, end=None):
+    """
+    Yield (window, label) pairs from several tickers at once, one ticker file in memory per cycle slot.
+
+    :param paths: Ticker price files.
+    :param split: 'train' for the first TRAIN_FRACTION of every ticker, 'validation' for the rest.
+    :param cycle_length: Number of tickers whose windows are mixed at the same time.
+    :param seed: Seed for the order of tickers and windows.
+    :return: Generator of (window of shape (SEQUENCE_LENGTH, 1), label of shape (1,)).
+    """
+    rng = random.Random(seed)
+    pending = list(paths)
+    rng.shuffle(pending)
+    active = []
+
+    def open_next():
+        # Returns an iterator over one ticker's windows in a random order
+        while pending:
+            scaled = load_scaled_close(pending.pop(), start, end)
+            split_index = int(len(scaled) * TRAIN_FRACTION)
+            series = scaled[:split_index] if split == 'train' else scaled[max(split_index - SEQUENCE_LENGTH, 0):]
+            windows = sliding_windows(series, SEQUENCE_LENGTH)[:-1]
+            if len(windows) == 0:
+                continue
+            order = list(range(len(windows)))
+            rng.shuffle(order)
+            return ((windows[i], series[i + SEQUENCE_LENGTH]) for i in order)
+        return None
+
+    while pending or active:
+        while len(active) < cycle_length:
+            windows = open_next()
+            if windows is None:
+                break
+            active.append(windows)
+        if not active:
+            break
+        slot = rng.randrange(len(active))
+        try:
+            window, label = next(active[slot])
+        except StopIteration:
+            active.pop(slot)
+            continue
+        yield window.reshape(SEQUENCE_LENGTH, 1), np.array([label], dtype=np.float32)
+
+
+def make_dataset(paths, split, batch_size, shuffle_buffer, cycle_length, seed=None, start=None, end=None):
+    """
+    Build a tf.data pipeline that streams, shuffles and batches windows from the ticker files.
+    """
+    import tensorflow as tf
+
+    signature = (tf.TensorSpec(shape=(SEQUENCE_LENGTH, 1), dtype=tf.float32),
+                 tf.TensorSpec(shape=(1,), dtype=tf.float32))
+    dataset = tf.data.Dataset.from_generator(
+        lambda: window_generator(paths, split, cycle_length, seed, start, end), output_signature=signature)
+    if split == 'train':
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def build_model(learning_rate=0.01):
+    """
+    Build the same LSTM -> Dropout -> Dense architecture as the shipped model.
+    """
+    from tensorflow import keras
+
+    model = keras.Sequential([
+        keras.Input(shape=(SEQUENCE_LENGTH, 1)),
+        keras.layers.LSTM(90),
+        keras.layers.Dropout(0.2),
+        keras.layers.Dense(1),
+    ])
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate), loss='mean_squared_error')
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Retrain the LSTM model from a folder of <TICKER>.parquet or <TICKER>.csv price files.')
+    parser.add_argument('--prices-dir', required=True, help='Folder with one parquet or CSV file of prices per ticker.')
+    parser.add_argument('--tickers', help='Comma separated tickers to train on, defaults to every file in the folder.')
+    parser.add_argument('--output', default='my_lstm_model.keras', help='Where to save the trained model (default: %(default)s).')
+    parser.add_argument('--start', help='First price date to train on.')
+    parser.add_argument('--end', help='Date to stop before.')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--shuffle-buffer', type=int, default=10000, help='Windows held in the shuffle buffer (default: %(default)s).')
+    parser.add_argument('--cycle-length', type=int, default=8, help='Tickers streamed at the same time (default: %(default)s).')
+    parser.add_argument('--learning-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    tickers = [ticker.strip() for ticker in args.tickers.split(',')] if args.tickers else None
+    paths = list_price_files(args.prices_dir, tickers)
+    if not paths:
+        parser.error(f"No price files found in {args.prices_dir}")
+
+    from tensorflow import keras
+
+    train = make_dataset(paths, 'train', args.batch_size, args.shuffle_buffer, args.cycle_length, args.seed, args.start, args.end)
+    validation = make_dataset(paths, 'validation', args.batch_size, args.shuffle_buffer, args.cycle_length, args.seed, args.start, args.end)
+
+    model = build_model(args.learning_rate)
+    model.fit(train, validation_data=validation, epochs=args.epochs,
+              callbacks=[keras.callbacks.EarlyStopping(patience=3, restore_best_weights=True)])
+    model.save(args.output)
+    print(f"Model saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Transaction history of a demo account, read page by page or streamed for export.
+
+Pages are found by keyset: a page ends at the (timestamp, transaction_id) of its last row and the
+next page starts right after it, so every page costs the same however far back it is. Rows are
+read through a named (server-side) cursor, which keeps them on the database server until they are
+fetched, chunk by chunk.
+
+FORCA_HISTORY_PAGE_SIZE         rows per page on the profile page (default 50)
+FORCA_EXPORT_CHUNK_ROWS         rows fetched and written at a time by an export (default 5000)
+"""
+import csv
+import os
+import tempfile
+import uuid
+
+import pandas as pd
+
+from database import db_transaction
+
+PAGE_SIZE = int(os.environ.get('FORCA_HISTORY_PAGE_SIZE', 50))
+EXPORT_CHUNK_ROWS = int(os.environ.get('FORCA_EXPORT_CHUNK_ROWS', 5000))
+
+COLUMNS = ['Transaction ID', 'Type', 'Symbol', 'Quantity', 'Price', 'Timestamp', 'Status']
+
+# Newest first, the index on (demo_id, timestamp, transaction_id) serves both the filter and the order
+HISTORY_SQL = """
+    SELECT transaction_id, transaction_type, stock_symbol, quantity, price, timestamp, status
+    FROM transactions
+    WHERE demo_id = (SELECT demo_id FROM demo_accounts WHERE user_id = %(user_id)s) {keyset}
+    ORDER BY timestamp DESC, transaction_id DESC
+    LIMIT %(limit)s;
+"""
+# Rows older than the cursor, compared as a row so ties on timestamp are ordered by ID
+KEYSET_CONDITION = "AND (timestamp, transaction_id) < (%(before_timestamp)s, %(before_id)s)"
+
+
+def iter_history(user_id, before=None, limit=None, chunk_size=EXPORT_CHUNK_ROWS):
+    """
+    Read the transactions of a user's demo account, newest first, in chunks.
+
+    The connection stays checked out until the generator is exhausted or closed.
+
+    :param user_id: User ID.
+    :param before: (timestamp, transaction_id) cursor, only older transactions are read.
+    :param limit: Maximum number of rows, None reads all of them.
+    :param chunk_size: Rows fetched from the server at a time.
+    :return: Generator of DataFrames with COLUMNS, at most chunk_size rows each.
+    """
+    before_timestamp, before_id = before if before else (None, None)
+    with db_transaction() as conn:
+        # Named cursors live on the server and need a name that is unique within the connection
+        with conn.cursor(name=f"history_{uuid.uuid4().hex}") as cur:
+            cur.itersize = chunk_size
+            # LIMIT NULL reads every row
+            cur.execute(HISTORY_SQL.format(keyset=KEYSET_CONDITION if before else ''), {
+                'user_id': user_id, 'before_timestamp': before_timestamp, 'before_id': before_id, 'limit': limit,
+            })
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield pd.DataFrame(rows, columns=COLUMNS)
+
+
+def history_page(user_id, before=None, page_size=PAGE_SIZE):
+    """
+    Read one page of a user's transaction history.
+
+    :param user_id: User ID.
+    :param before: Cursor returned with the previous page, None for the newest page.
+    :param page_size: Rows per page.
+    :return: Tuple of the page DataFrame and the cursor of the next page, None on the last page.
+    """
+    # One row more than the page tells whether there is a next page
+    chunks = list(iter_history(user_id, before, limit=page_size + 1, chunk_size=page_size + 1))
+    page = chunks[0] if chunks else pd.DataFrame(columns=COLUMNS)
+    if len(page) <= page_size:
+        return page, None
+    page = page.iloc[:page_size]
+    last = page.iloc[-1]
+    return page, (last['Timestamp'].to_pydatetime(), int(last['Transaction ID']))
+
+
+def _write_csv(chunks, f):
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    for chunk in chunks:
+        writer.writerows(chunk.itertuples(index=False))
+
+
+def _write_parquet(chunks, f):
+    # pyarrow comes with streamlit, only the exports need it
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('Transaction ID', pa.int64()), ('Type', pa.string()), ('Symbol', pa.string()), ('Quantity', pa.int64()),
+        ('Price', pa.float64()), ('Timestamp', pa.timestamp('us')), ('Status', pa.string()),
+    ])
+    with pq.ParquetWriter(f, schema) as writer:
+        for chunk in chunks:
+            # DECIMAL prices arrive as Decimal objects
+            chunk = chunk.astype({'Price': 'float64'})
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+EXPORT_FORMATS = {
+    # Format to (writer, file mode, MIME type)
+    'csv': (_write_csv, 'w+', 'text/csv'),
+    'parquet': (_write_parquet, 'w+b', 'application/vnd.apache.parquet'),
+}
+
+
+def export_history(user_id, export_format='csv', chunk_size=EXPORT_CHUNK_ROWS):
+    """
+    Write a user's whole transaction history to a temporary file, one chunk of rows at a time.
+
+    Only one chunk is held in memory, however long the history is.
+
+    :param user_id: User ID.
+    :param export_format: 'csv' or 'parquet'.
+    :param chunk_size: Rows fetched and written at a time.
+    :return: Temporary file positioned at its start, deleted when it is closed.
+    """
+    write, mode, _ = EXPORT_FORMATS[export_format]
+    f = tempfile.TemporaryFile(mode=mode, **({'newline': ''} if 'b' not in mode else {}))
+    try:
+        write(iter_history(user_id, chunk_size=chunk_size), f)
+        f.seek(0)
+    except BaseException:
+        f.close()
+        raise
+    return f
@@ -0,0 +1,133 @@
+"""
+Guards for the outbound HTTP calls to Yahoo Finance, Wikipedia and Alpha Vantage.
+
+Concurrent callers asking for the same thing (same upstream and key) share one in-flight
+request, so a cache expiring under many sessions turns into a single upstream call. An upstream
+that keeps failing is not called for a while: after FAILURE_THRESHOLD failures in a row its
+circuit opens for BASE_BACKOFF seconds, doubling up to MAX_BACKOFF while it keeps failing.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+FAILURE_THRESHOLD = 5
+BASE_BACKOFF = 5
+MAX_BACKOFF = 300
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling an upstream whose circuit is open.
+    """
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time, callers arriving while it runs get the same result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def do(self, key, function):
+        """
+        :param key: Hashable description of the request.
+        :param function: Function without arguments that makes the request.
+        :return: The result of function, shared with every concurrent caller for key.
+        """
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(function())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+        return future.result()
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream after repeated failures and lets one trial call through after a backoff.
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, base_backoff=BASE_BACKOFF, max_backoff=MAX_BACKOFF):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.backoff = base_backoff
+        self.open_until = 0.0
+        self.trial_running = False
+
+    def _before_call(self):
+        with self.lock:
+            if self.failures < self.failure_threshold:
+                return
+            if time.monotonic() < self.open_until or self.trial_running:
+                raise CircuitOpenError(f"{self.name} is unavailable, retrying in {max(0.0, self.open_until - time.monotonic()):.0f}s")
+            # Half open, this call is the trial
+            self.trial_running = True
+
+    def call(self, function):
+        """
+        :param function: Function without arguments that makes the request.
+        :return: The result of function.
+        :raises CircuitOpenError: If the circuit is open.
+        """
+        self._before_call()
+        try:
+            result = function()
+        except Exception:
+            with self.lock:
+                self.trial_running = False
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    if self.failures > self.failure_threshold:
+                        # The trial failed too, wait longer before the next one
+                        self.backoff = min(self.backoff * 2, self.max_backoff)
+                    self.open_until = time.monotonic() + self.backoff
+                    print(f"{self.name} failed {self.failures} times in a row, pausing calls for {self.backoff:.0f}s")
+            raise
+        with self.lock:
+            self.trial_running = False
+            self.failures = 0
+            self.backoff = self.base_backoff
+        return result
+
+
+class Upstream:
+    """
+    One external service, with its own single-flight group and circuit breaker.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.flights = SingleFlight()
+        self.breaker = CircuitBreaker(name)
+
+    def call(self, key, function):
+        """
+        Make a request, sharing it with concurrent callers for the same key.
+
+        :param key: Hashable description of the request, for example ('history', ticker, start, end).
+        :param function: Function without arguments that makes the request.
+        :return: The result of function.
+        """
+        return self.flights.do(key, lambda: self.breaker.call(function))
+
+
+YAHOO = Upstream('Yahoo Finance')
+WIKIPEDIA = Upstream('Wikipedia')
+ALPHA_VANTAGE = Upstream('Alpha Vantage')
@@ -0,0 +1,39 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(data, sequence_length):
+    """
+    Return every window of sequence_length consecutive rows as a read-only strided view.
+
+    No data is copied: window i shares memory with data[i:i + sequence_length].
+
+    :param data: Array of shape (n,) or (n, 1).
+    :param sequence_length: Number of data points in a window.
+    :return: View of shape (n - sequence_length + 1, sequence_length) for 1-D input,
+             or (n - sequence_length + 1, sequence_length, 1) for column input.
+    """
+    data = np.asarray(data)
+    if len(data) < sequence_length:
+        return np.empty((0, sequence_length) + data.shape[1:], dtype=data.dtype)
+    if data.ndim == 1:
+        return sliding_window_view(data, sequence_length)
+    # sliding_window_view puts the window axis last, move it back next to the sample axis
+    return sliding_window_view(data, sequence_length, axis=0).swapaxes(1, 2)
+
+
+def last_window(data, sequence_length, offset=0):
+    """
+    Return only the window that ends offset rows before the end of the data.
+
+    This is the fast path for forecasting, which only ever needs the most recent window.
+
+    :param data: Array of shape (n,) or (n, 1).
+    :param sequence_length: Number of data points in a window.
+    :param offset: Number of trailing rows to leave out of the window.
+    :return: View of shape (sequence_length,) or (sequence_length, 1).
+    """
+    end = len(data) - offset
+    if end < sequence_length:
+        raise ValueError(f"Need at least {sequence_length + offset} data points, got {len(data)}.")
+    return data[end - sequence_length:end]